@@ -1,17 +1,306 @@
 """
 Shared Agent Configuration for Jack in the Box Voice Agent
 Used by both terminal and web versions
+
+get_agent_settings() returns a fresh plain dict on every call, so callers may
+mutate it or json.dumps() it. The prebuilt agent block behind it is frozen
+(MappingProxyType / tuple) and private to this module.
 """
 
+import functools
+import hashlib
+import json
+import os
+import re
+import string
+import sys
+import textwrap
+import types
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # optional - falls back to stdlib json
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _json_dumps(obj):
+    """Compact JSON text; read-only mappings are serialized as plain dicts"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=dict).decode()
+    return json.dumps(obj, default=dict, separators=(",", ":"))
+
+
 # Audio settings
 MIC_SR = 48000  # Input from mic
 SPK_SR = 16000  # Output to speaker
 CHANNELS = 1
 
+# LLM used by the agent's think provider
+THINK_MODEL = "gpt-4o-mini"
+
+# Speech-to-text keyterm boosts - interned once, shared by every settings payload
+KEYTERMS = tuple(sys.intern(term) for term in ("Hi-C", "Barq's", "Coca-cola", "Coke", "Fanta", "Iced Coffee"))
+
+# Data files ship alongside this module
+_HERE = Path(__file__).parent
+
+
+def _freeze(obj):
+    """Recursively convert dicts to read-only MappingProxyType and lists to tuples"""
+    if isinstance(obj, dict):
+        return types.MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+def _squeeze_whitespace(text):
+    """Collapse source-code indentation and repeated spaces; newlines are kept for list structure"""
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in textwrap.dedent(text).splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+# Prompt version - selects prompts/jitb_{version}.md (JITB_PROMPT_VERSION, overridable via reload_prompt)
+_prompt_version_override = None
+
+
+def _prompt_version():
+    """Active prompt version, read at build time so .env values loaded after import are honored"""
+    return _prompt_version_override or os.getenv("JITB_PROMPT_VERSION", "v1")
+
+
+@functools.lru_cache(maxsize=None)
+def load_prompt(version):
+    """
+    Load the stable prompt prefix template for a prompt version
+    
+    The template holds rules that never change during a shift. Its rendered text is
+    kept first and byte-identical across sessions so OpenAI's automatic prompt caching
+    can reuse it (needs >= 1024 tokens). Menu-specific text ($slots) comes from
+    prompt_menu.json via render_prompt().
+    
+    Args:
+        version: Prompt version, e.g. "v1" for prompts/jitb_v1.md
+    
+    Returns:
+        string.Template: Stable prompt prefix template
+    """
+    if not re.fullmatch(r"[\w-]+", version):
+        raise ValueError(f"Invalid prompt version: {version!r}")
+    return string.Template((_HERE / "prompts" / f"jitb_{version}.md").read_text(encoding="utf-8"))
+
+
+# Rendered stable prefixes keyed by (prompt version, menu revision)
+_rendered_prompts = {}
+
+
+def _load_prompt_menu():
+    """Load the menu-specific prompt data (fries variants, drink aliases, examples) from prompt_menu.json"""
+    with open(_HERE / "prompt_menu.json", "rb") as f:
+        return _json_loads(f.read())
+
+
+def _render_drink_aliases(drink_aliases):
+    """Render drink aliases, e.g. '"coke", "large coke" → query "coca cola"'"""
+    return ". ".join(
+        ", ".join(f'"{said}"' for said in alias["says"]) + f' → query "{alias["query"]}"'
+        for alias in drink_aliases
+    )
+
+
+def render_prompt(menu, version="v1"):
+    """
+    Render the stable prompt prefix for a menu snapshot
+    
+    Args:
+        menu: Menu prompt data as loaded from prompt_menu.json
+        version: Prompt version to render
+    
+    Returns:
+        str: Stable prompt prefix, cached by (version, menu["revision"]) so an unchanged menu is not re-rendered
+    """
+    key = (version, menu.get("revision"))
+    if key not in _rendered_prompts:
+        _rendered_prompts[key] = sys.intern(_squeeze_whitespace(load_prompt(version).substitute(
+            regular_fries_name=menu["regular_fries_name"],
+            fries_variants=", ".join(menu["fries_variants"]),
+            drink_example=menu["drink_example"],
+            drink_aliases=_render_drink_aliases(menu["drink_aliases"]),
+            example_item_path_key=menu["example_item_path_key"],
+            example_combo_number=menu["example_combo"]["number"],
+            example_combo_name=menu["example_combo"]["name"],
+        )))
+    return _rendered_prompts[key]
+
+
+def _load_combo_table():
+    """
+    Load the combo number table from combos.json
+    
+    The table tracks the daily menu, so it lives in the dynamic prompt suffix.
+    """
+    with open(_HERE / "combos.json", "rb") as f:
+        return _json_loads(f.read())
+
+
+def _render_dynamic(combo_table_json):
+    """Render the dynamic prompt suffix (today's menu data) appended after the stable prefix"""
+    return "".join([
+        "COMBO NUMBER TABLE - mapping of combo numbers to their respective items:\n",
+        combo_table_json,
+    ])
+
+
+@functools.lru_cache(maxsize=None)
+def _load_function_schemas():
+    """Load the function schemas from the agent_config_functions.json sidecar (read once)"""
+    with open(_HERE / "agent_config_functions.json", "rb") as f:
+        return _json_loads(f.read())
+
+
+def _render_settings_json(agent_block_json, mic_sample_rate, speaker_sample_rate):
+    """Encode only the small audio section and splice in the pre-serialized agent block"""
+    audio_json = _json_dumps({
+        "input": {"encoding": "linear16", "sample_rate": mic_sample_rate},
+        "output": {"encoding": "linear16", "sample_rate": speaker_sample_rate, "container": "none"}
+    })
+    return f'{{"type":"Settings","audio":{audio_json},"agent":{agent_block_json}}}'
+
+
+@functools.cache
+def _build():
+    """
+    Assemble the prompt, function schemas and agent block
+    
+    Runs once, on first use, so importing this module stays cheap. Results are
+    exposed as module attributes (SYSTEM_PROMPT, FUNCTIONS, COMBO_TABLE_TEXT, ...)
+    through __getattr__.
+    """
+    combo_table = _load_combo_table()
+    
+    # Compact JSON embedded in the prompt (no whitespace between tokens)
+    combo_table_text = _json_dumps(combo_table)
+    
+    prompt_version = _prompt_version()
+    prompt_stable = render_prompt(_load_prompt_menu(), prompt_version)
+    prompt_dynamic = _render_dynamic(combo_table_text)
+    
+    # Full system prompt - stable prefix first, dynamic suffix last
+    system_prompt = sys.intern("".join([prompt_stable, "\n\n", prompt_dynamic]))
+    
+    functions = _freeze(_load_function_schemas())
+    
+    # Fingerprint of the stable prefix - reload_prompt() logs whether it changed
+    stable_prompt_hash = hashlib.sha256(prompt_stable.encode("utf-8")).hexdigest()
+    
+    # Agent block (language, listen, think, speak, greeting) - independent of sample rates,
+    # so it is built once and shared by every settings dict
+    agent_block = _freeze({
+        "language": "en",
+        "listen": {
+            "provider": {
+                "type": "deepgram",
+                "model": "nova-3",
+                "keyterms": KEYTERMS
+            }
+        },
+        "think": {
+            "provider": {
+                "type": "open_ai",
+                "model": THINK_MODEL,
+                "temperature": 0.5
+            },
+            "prompt": system_prompt,
+            "functions": functions
+        },
+        "speak": {
+            "provider": {
+                "type": "deepgram",
+                "model": "aura-2-thalia-en"
+            }
+        },
+        "greeting": "Welcome to Jack in the Box. What can I get for you today?"
+    })
+    
+    # Pre-serialized agent block - encoded once, spliced into every settings payload
+    agent_block_json = _json_dumps(agent_block)
+    
+    default_settings_json = _render_settings_json(agent_block_json, MIC_SR, SPK_SR)
+    
+    return {
+        "PROMPT_VERSION": prompt_version,
+        "COMBO_TABLE_TEXT": combo_table_text,
+        "PROMPT_STABLE": prompt_stable,
+        "PROMPT_DYNAMIC": prompt_dynamic,
+        "SYSTEM_PROMPT": system_prompt,
+        "STABLE_PROMPT_HASH": stable_prompt_hash,
+        "FUNCTIONS": _load_function_schemas(),
+        "_AGENT_BLOCK": agent_block,
+        "_AGENT_BLOCK_JSON": agent_block_json,
+        # Ready-to-send payloads for the default sample rates
+        "_DEFAULT_SETTINGS_JSON": default_settings_json,
+        "_DEFAULT_SETTINGS_BYTES": default_settings_json.encode(),
+    }
+
+
+def __getattr__(name):
+    """Expose the lazily built constants as module attributes"""
+    built = _build()
+    if name in built:
+        return built[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def eager_init():
+    """Build the agent settings ahead of the first connection (call from app startup)"""
+    _build()
+
+
+def reload_prompt(version=None):
+    """
+    Re-read the prompt, menu data and function schemas from disk and rebuild the settings
+    
+    Enables zero-downtime prompt updates - new connections get the new settings,
+    no process restart needed.
+    
+    Args:
+        version: Prompt version to switch to (defaults to the current JITB_PROMPT_VERSION)
+    
+    Returns:
+        str: Active prompt version
+    """
+    global _prompt_version_override
+    
+    # Load the new template first - a missing prompt file raises here and keeps the current settings
+    load_prompt.cache_clear()
+    load_prompt(version or _prompt_version())
+    if version:
+        _prompt_version_override = version
+    
+    previous_hash = _build()["STABLE_PROMPT_HASH"]
+    
+    _load_function_schemas.cache_clear()
+    _rendered_prompts.clear()
+    _build.cache_clear()
+    
+    built = _build()
+    if built["STABLE_PROMPT_HASH"] == previous_hash:
+        print(f"🔁 Reloaded prompt {built['PROMPT_VERSION']} - stable prefix unchanged ({previous_hash[:12]}), provider prompt cache still applies")
+    else:
+        print(f"🔁 Reloaded prompt {built['PROMPT_VERSION']} - stable prefix changed ({previous_hash[:12]} → {built['STABLE_PROMPT_HASH'][:12]}), provider prompt cache starts cold")
+    return built["PROMPT_VERSION"]
+
+
 def get_agent_settings(mic_sample_rate=48000, speaker_sample_rate=16000):
     """
     Get Deepgram agent configuration settings
     
+    Decoded from the cached settings JSON, so every call gets its own plain
+    dict that is safe to mutate or json.dumps().
+    
     Args:
         mic_sample_rate: Sample rate for microphone input
         speaker_sample_rate: Sample rate for speaker output
@@ -19,305 +308,43 @@ def get_agent_settings(mic_sample_rate=48000, speaker_sample_rate=16000):
     Returns:
         dict: Agent configuration settings
     """
-    return {
-        "type": "Settings",
-        "audio": {
-            "input": {"encoding": "linear16", "sample_rate": mic_sample_rate},
-            "output": {"encoding": "linear16", "sample_rate": speaker_sample_rate, "container": "none"}
-        },
-        "agent": {
-            "language": "en",
-            "listen": {
-                "provider": {
-                    "type": "deepgram",
-                    "model": "nova-3",
-                    "keyterms": ["Hi-C", "Barq's", "Coca-cola", "Coke", "Fanta", "Iced Coffee"]
-                }
-            },
-            "think": {
-                "provider": {
-                    "type": "open_ai",
-                    "model": "gpt-4o-mini",
-                    "temperature": 0.5
-                },
-                "prompt": """You work taking orders at a Jack in the Box drive-thru. Follow these instructions strictly. Do not deviate:
-                    (1) Always speak in a friendly, casual tone like a real person. Keep responses SHORT - one or two sentences max. Don't over-explain or give extra information unless asked. When listing categories or items, give the complete list - NEVER use phrases like "and more" or "and others" to cut it short. 
-                    (2) Never repeat the customer's order back to them unless they ask for it.
-                    (3) If someone orders a breakfast item, ask if they would like an orange juice with that.
-                    (4) If someone orders a small or regular, ask "Would like to make that a large?".
-                    (5) Don't mention prices until the customer confirms that they're done ordering.
-                    (6) Allow someone to mix and match sizes for combos.
-                    (7) When someone orders a single burger, sandwich, or chicken item (not a combo), immediately ask "Would you like to make that a combo?" 
-                         If YES - CRITICAL: In your NEXT response when they say yes, you MUST execute ALL three functions (remove_item, query_items, add_item) BEFORE asking the sides/drinks question. Do NOT ask "What side and drink?" without first executing these three functions. Then ask "What side and drink would you like?" (SAVE itemPathKey!)
-                         When they specify sides/drinks: The combo is ALREADY ADDED. Only call query_modifiers + add_modifier for each side/drink. Do NOT call query_items or add_item again!
-                         If NO: Keep single item, ask "Anything else?"
-                    (8) At the end of the order, If someone has not ordered a dessert item AND has not ordered a breakfast item, ask if they would like to add a dessert.
-                    (9) If someones changes their single item orders to a combo, remove the previous single item order.
-                    (10) Don't respond with ordered lists.
-                    (11) CRITICAL COMBO RULE: When someone orders ANY combo (whether by name or number):
-                         If sides/drinks included: Call query_items ONCE + add_item ONCE + query_modifiers + add_modifier for each (SAVE itemPathKey!)
-                         If sides/drinks NOT specified: Call query_items ONCE + add_item ONCE, then ask "What side and drink would you like?" (SAVE itemPathKey!)
-                         When they specify sides/drinks later: The combo is ALREADY ADDED. Only call query_modifiers + add_modifier for each side/drink. Do NOT call query_items or add_item again - the combo is already in the order!
-                         NEVER query modifiers before add_item! NEVER add the same combo twice!
-                    (12) Hierarchical menu browsing (ALWAYS use real Qu menu data):
-                        - For "what do you have?" or very general queries: Call get_menu_categories() - this instantly returns ALL top-level menu categories (pre-loaded from Qu). List ALL categories conversationally - NEVER say "and more". Read all categories from the response and list them naturally.
-                        - For category queries like "what [category name]?": Call get_category_items(category) - this instantly returns all items in that category (pre-loaded from Qu). List 3-5 popular items casually. Don't read the entire list if there are too many.
-                        - For specific item queries like "do you have [item name]?": Call query_items with the exact item name for semantic search. Only confirm availability based on query_items results.
-                        - IMPORTANT: Category names come directly from Qu API and may change daily. Always use the exact category names returned by get_menu_categories().
-                    (13) Order completion flow: After asking about dessert, call submit_order_to_qu, tell them the total price, THEN ask them to drive to the window. Never say "drive to window for your total" - always give the total first.
-                    (14) Function calling rules - DO THIS EVERY TIME:
-                        (A) When customer orders an item: Call query_items → **ALWAYS USE THE FIRST RESULT** → Call add_item with that itemPathKey
-                        (A1) ⚠️ CRITICAL: query_items/query_modifiers return a RANKED list - the FIRST result is the BEST match! ALWAYS use results[0].itemPathKey - NEVER skip to results[1] or results[2]!
-                        (A2) ⚠️ CRITICAL - COMBO WITH SIDES/DRINKS IN SAME SENTENCE: When customer orders "Jumbo Jack with curly fries and a coke":
-                             CORRECT FLOW:
-                             1. query_items("Jumbo Jack") ← Only query the COMBO, NOT the sides/drinks
-                             2. add_item(itemPathKey from step 1) ← Add combo FIRST
-                             3. query_modifiers("curly fries", parent=itemPathKey from step 2)
-                             4. add_modifier(itemId from step 2, itemPathKey from step 3)
-                             5. query_modifiers("coca cola", parent=itemPathKey from step 2) ← Use "coca cola" NOT "coke"!
-                             6. add_modifier(itemId from step 2, itemPathKey from step 5)
-                             
-                             WRONG FLOW (DO NOT DO THIS):
-                             ❌ query_items("coke") - NO! Use query_modifiers instead
-                             ❌ query_items("curly fries") - NO! Use query_modifiers instead
-                             ❌ add_item for fries/drinks - NO! Use add_modifier instead
-                             
-                             Remember: For combo sides/drinks, SKIP query_items entirely. Go straight to query_modifiers + add_modifier!
-                        (B) COMBO SPECIAL RULE: After calling add_item for a combo, you MUST ask for side/drink BEFORE doing anything else. Do not call order(), do not ask about dessert, do not move on. Get the side/drink first!
-                        (C) When they specify modifiers/sides/drinks for a combo: The combo MUST already be in the order (via add_item) before you can add modifiers. If you've already called add_item for this combo, do NOT call it again!
-                        (C1) ⚠️ CRITICAL - CHANGING SIDES/DRINKS: When customer wants to change a side or drink (e.g., "change curly fries to regular fries"):
-                             - DO NOT call delete_item to remove the entire combo!
-                             - Instead: Call query_modifiers for the new side/drink, then call add_modifier with the new itemPathKey
-                             - The system will AUTOMATICALLY replace the old side/drink with the new one
-                             - Keep the combo in the order - just add the new modifier!
-                             - Note: "Regular fries" are called "French Fries" in the menu. "Fries" variants available: French Fries, Curly Fries, Garlic Fries, Garlic Curly Fries, Halfsies Fries
-                             - Example: Customer has combo with curly fries and says "change to regular fries"
-                               1. query_modifiers(query="regular fries", parent="47587-56634-105606") or query_modifiers(query="french fries", parent="47587-56634-105606")
-                               2. add_modifier(itemId="xxx", itemPathKey=result_from_query_modifiers)
-                               3. Done! The old curly fries will be automatically replaced
-                             Example for combo sides/drinks when combo is ALREADY ADDED: "Curly fries and a Coke" = 
-                             1. query_modifiers("curly fries", parent=itemPathKey from previous add_item)
-                             2. add_modifier
-                             3. query_modifiers("coca cola", parent=itemPathKey from previous add_item) ← Use "coca cola" NOT "coke"!
-                             4. add_modifier
-                             Do NOT call query_items or add_item again - the combo is already in the order!
-                        (D) CRITICAL FOR COMBOS: The "parent" parameter in query_modifiers MUST be the itemPathKey (EXAMPLE: "47587-56634-105606"), NOT the itemId (UUID like "7e2bb5d9-...").
-                        (E) ⚠️ BANNED FOR COMBO SIDES/DRINKS: NEVER use query_items for fries, drinks, or any side when you already have a combo in the order. ALWAYS use query_modifiers with the combo's itemPathKey as parent. query_items will give you standalone items which will be rejected by the system! 
-                             - When add_item returns both itemId and itemPathKey, USE THE itemPathKey (the one from add_item response) for query_modifiers.
-                             - Example: If add_item returned itemPathKey "47587-56634-105606", call: query_modifiers(query="fries", parent="47587-56634-105606")
-                             - IMPORTANT: Use the ACTUAL itemPathKey from add_item response, not this example value!
-                        (F) For drinks: Use "Mod -" items (like "Mod - Coca Cola"), not "Flavor Shot -"
-                        (F1) ⚠️ CRITICAL - COKE/COCA-COLA CLARIFICATION:
-                             - When customer says "coke", "large coke", "regular coke" → query_modifiers with query="coca cola" (NOT "coke")
-                             - This will return "Mod - Coca Cola" (the actual drink, NOT "Flavor Shot")
-                             - "Diet Coke", "diet" → query_modifiers with query="diet coke"
-                             - "Coke Zero", "zero sugar" → query_modifiers with query="coca cola zero"
-                             - ALWAYS query for "coca cola" to get "Mod - Coca Cola", NEVER accept "Flavor Shot - Coke/Coke Zero"
-                             - Note: "Large" refers to size, not a different drink.
-                        (G) Use get_menu_categories() for "what do you have?", get_category_items(category) for category-specific queries
-                        (H) EVERY item MUST call add_item. EVERY modifier MUST call add_modifier. No shortcuts!
-                        (I) ⚠️ CRITICAL - DESSERTS ARE STANDALONE ITEMS:
-                             - Desserts (cakes, shakes, churros, etc.) are NEVER combo modifiers
-                             - ALWAYS use query_items → add_item for desserts (same as burgers/sandwiches)
-                             - NEVER use query_modifiers or add_modifier for desserts
-                             - Example: "Can I get cheesecake?" → query_items("cheesecake") → add_item(itemPathKey)
-                             - Example: "Add a shake" → query_items("shake") → add_item(itemPathKey)
-                    
-                    (15) ⚠️ CRITICAL - COMBO NUMBERS VS itemPathKey:
-                         Sometimes, people will order combos by their combo numbers. Here is a mapping of combo numbers to their respective items:
-                            [
-                                { "combo_number": 1, "combo_name": "Sourdough Jack" },
-                                { "combo_number": 2, "combo_name": "Double Jack" },
-                                { "combo_number": 3, "combo_name": "Swiss Buttery Jack" },
-                                { "combo_number": 4, "combo_name": "Bacon Ultimate Cheeseburger" },
-                                { "combo_number": 5, "combo_name": "Bacon Double SmashJack" },
-                                { "combo_number": 6, "combo_name": "Jumbo Jack Cheeseburger" },
-                                { "combo_number": 6, "combo_name": "Jumbo Jack" },
-                                { "combo_number": 7, "combo_name": "Butter SmashJack" },
-                                { "combo_number": 8, "combo_name": "Ultimate Cheeseburger" },
-                                { "combo_number": 9, "combo_name": "Smash Jack" },
-                                { "combo_number": 10, "combo_name": "Homestyle Chicken" },
-                                { "combo_number": 11, "combo_name": "Cluck Chicken" },
-                                { "combo_number": 12, "combo_name": "8 Piece Nuggets" },
-                                { "combo_number": 13, "combo_name": "Crispy Chicken Strips (5pc)" },
-                                { "combo_number": 13, "combo_name": "Crispy Chicken Strips (3pc)" },
-                                { "combo_number": 14, "combo_name": "Spicy Chicken" },
-                                { "combo_number": 14, "combo_name": "Spicy Chicken Cheese" },
-                                { "combo_number": 15, "combo_name": "Grilled Chicken Sandwich" },
-                                { "combo_number": 16, "combo_name": "Chicken Teriyaki Bowl" },
-                                { "combo_number": 17, "combo_name": "Chicken Fajita Wrap" },
-                                { "combo_number": 18, "combo_name": "Garden Salad" },
-                                { "combo_number": 18, "combo_name": "Garden Crispy Chicken Salad Combo" },
-                                { "combo_number": 18, "combo_name": "Garden Grilled Chicken Salad Combo" },
-                                { "combo_number": 18, "combo_name": "Garden Salad, No Chicken" },
-                                { "combo_number": 19, "combo_name": "Southwest Salad" },
-                                { "combo_number": 19, "combo_name": "Southwest Crispy Chicken Salad Combo" },
-                                { "combo_number": 19, "combo_name": "Southwest Grilled Chicken Salad Combo" },
-                                { "combo_number": 19, "combo_name": "Southwest Salad, No Chicken" },
-                                { "combo_number": 21, "combo_name": "Supreme Croissant" },
-                                { "combo_number": 22, "combo_name": "Sausage Croissant" },
-                                { "combo_number": 23, "combo_name": "Loaded Breakfast" },
-                                { "combo_number": 24, "combo_name": "Supreme Sourdough Breakfast" },
-                                { "combo_number": 25, "combo_name": "Ultimate Breakfast" },
-                                { "combo_number": 26, "combo_name": "Extreme Sausage" },
-                                { "combo_number": 27, "combo_name": "Meat Lover Burrito" },
-                                { "combo_number": 28, "combo_name": "3pc French Toast Platter Bacon" },
-                                { "combo_number": 28, "combo_name": "3pc French Toast Platter Sausage" },
-                                { "combo_number": 28, "combo_name": "3pc French Toast Platter Bacon Sausage" },
-                                { "combo_number": 29, "combo_name": "6pc French Toast" }
-                            ]
-                         ⚠️ ⚠️ ⚠️ CRITICAL WARNING ⚠️ ⚠️ ⚠️
-                         Combo numbers (1, 2, 3, etc.) are ONLY for customer reference!
-                         NEVER use combo numbers as itemPathKey in add_item()!
-                         
-                         CORRECT FLOW when customer orders "Combo #6":
-                         1. Call query_items("Jumbo Jack combo") → Get results list → **USE THE FIRST RESULT** (results[0])
-                         2. Extract itemPathKey from results[0] (EXAMPLE FORMAT: "47587-56635-99286")
-                         3. Call add_item with results[0].itemPathKey - NOT with "6"!
-                         
-                         itemPathKey format EXAMPLE: "47587-56634-105606" (long string with dashes)
-                         NOT: "6" or any single digit!
-                         
-                         IMPORTANT: itemPathKey values are DYNAMIC and come from query_items.
-                         NEVER hardcode itemPathKey values - always use what query_items returns!
-                         """,
-                "functions": [
-                    {
-                        "name": "order",
-                        "description": "Call this ONLY when the customer explicitly asks to review their order (e.g., 'What's in my order?' or 'Can you repeat that?'). DO NOT call this after adding items - just continue taking the order.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {},
-                            "required": []
-                        }
-                    },
-                    {
-                        "name": "query_items",
-                        "description": "Call this to query standalone menu items from any category. ⚠️ DO NOT use this for combo sides/drinks - use query_modifiers instead! This returns standalone items which cannot be added as modifiers to combos.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "query": {
-                                    "type": "string",
-                                    "description": "A query for the item the user is interested in."
-                                },
-                                "limit": {
-                                    "type": "integer",
-                                    "description": "The number of results to return. The default is 5. If it seems like the item might be found if more results are returned, specify a larger value."
-                                }
-                            },
-                            "required": ["query"]
-                        }
-                    },
-                    {
-                        "name": "query_modifiers",
-                        "description": "Call this to query the available modifiers on items, such as sauces, sides, toppings, etc. ⚠️ REQUIRED for combo sides/drinks - NEVER use query_items for combo sides/drinks as it will return invalid standalone items. This function returns modifiers that belong to the parent item (like fries that belong to a combo). Always provide the parent itemPathKey. NOTE: For Coke, query 'coca cola' (NOT 'coke') to get 'Mod - Coca Cola' (the actual drink, NOT 'Flavor Shot').",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "query": {
-                                    "type": "string",
-                                    "description": "A query for the modifier the user is interested in (e.g., 'curly fries', 'coca cola'). For Coke, use 'coca cola' (NOT 'coke') to get 'Mod - Coca Cola'. For Diet Coke, use 'diet coke'."
-                                },
-                                "parent": {
-                                    "type": "string",
-                                    "description": "REQUIRED. MUST be the itemPathKey (EXAMPLE format: '47587-56634-105606'), NEVER the itemId (UUID). For combos, use the combo's itemPathKey from add_item response. This value is DYNAMIC - use the actual itemPathKey returned by add_item, not a hardcoded value!"
-                                },
-                                "limit": {
-                                    "type": "integer",
-                                    "description": "The number of results to return. The default is 5. If it seems like the item might be found if more results are returned, specify a larger value."
-                                }
-                            },
-                            "required": ["query", "parent"]
-                        }
-                    },
-                    {
-                        "name": "add_item",
-                        "description": "Add an item to the order. When the user has confirmed they want this item added to their order, call this function. Make sure you first obtain the itemPathKey by calling the query_item function before calling this function. IMPORTANT: This returns an object with 'itemId' (UUID) and 'itemPathKey' (EXAMPLE format: '47587-56634-105606'). For COMBOS, save the itemPathKey from the response - you will need it as the 'parent' parameter when calling query_modifiers for sides/drinks. The itemPathKey is DYNAMIC and changes daily with menu refreshes.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "itemPathKey": {
-                                    "type": "string",
-                                    "description": "The unique item path key identifying the item. Format: '47587-56634-105606' (long string with dashes). NEVER use combo numbers (1, 2, 3, etc.) - only use the itemPathKey from query_items result!"
-                                }
-                            },
-                            "required": ["itemPathKey"]
-                        }
-                    },
-                    {
-                        "name": "delete_item",
-                        "description": "Deletes an item to the order. Make sure you first obtain the itemId by calling the order function before calling this function.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "itemId": {
-                                    "type": "string",
-                                    "description": "The unique item id identifying the item in the order."
-                                }
-                            },
-                            "required": ["itemId"]
-                        }
-                    },
-                    {
-                        "name": "add_modifier",
-                        "description": "Adds a modifier to an item on an order. Make sure you first obtain the itemId of the item and the itemPathKey of the modifier by calling other functions before calling this function.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "itemPathKey": {
-                                    "type": "string",
-                                    "description": "The unique item path key identifying the modifier."
-                                },
-                                "itemId": {
-                                    "type": "string",
-                                    "description": "The unique item id identifying the item in the order."
-                                }
-                            },
-                            "required": ["itemPathKey", "itemId"]
-                        }
-                    },
-                    {
-                        "name": "submit_order_to_qu",
-                        "description": "Submit the completed order to Qu API for fulfillment. Call this after the customer confirms they are done ordering and ready to complete their purchase. This will finalize the order in the Qu system.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {},
-                            "required": []
-                        }
-                    },
-                    {
-                        "name": "get_menu_categories",
-                        "description": "Get the top-level menu categories (pre-loaded at startup for fast response). Call this ONLY for general queries like 'what do you have?' or 'what's on the menu?'. Returns a list of all available categories.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {},
-                            "required": []
-                        }
-                    },
-                    {
-                        "name": "get_category_items",
-                        "description": "Get all items for a specific category (pre-loaded at startup for instant response). Call this for category-specific queries when customer asks about a specific category. Use the exact category names from get_menu_categories(). Much faster than query_items for browsing categories.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "category": {
-                                    "type": "string",
-                                    "description": "The category name to get items for. Use exact category names from get_menu_categories() response (e.g., 'Breakfast', 'Lunch/Dinner', 'Snacks, Sides & Extras', 'Drinks')"
-                                }
-                            },
-                            "required": ["category"]
-                        }
-                    }
-                ]
-            },
-            "speak": {
-                "provider": {
-                    "type": "deepgram",
-                    "model": "aura-2-thalia-en"
-                }
-            },
-            "greeting": "Welcome to Jack in the Box. What can I get for you today?"
-        }
-    }
+    return _json_loads(get_agent_settings_json(mic_sample_rate, speaker_sample_rate))
 
+
+def get_agent_settings_json(mic_sample_rate=MIC_SR, speaker_sample_rate=SPK_SR):
+    """
+    Get the Deepgram agent settings as a ready-to-send JSON string
+    
+    The default sample rates return the payload serialized on first use;
+    other rates only re-encode the audio section.
+    
+    Args:
+        mic_sample_rate: Sample rate for microphone input
+        speaker_sample_rate: Sample rate for speaker output
+    
+    Returns:
+        str: JSON-encoded Settings message
+    """
+    built = _build()
+    if mic_sample_rate == MIC_SR and speaker_sample_rate == SPK_SR:
+        return built["_DEFAULT_SETTINGS_JSON"]
+    return _render_settings_json(built["_AGENT_BLOCK_JSON"], mic_sample_rate, speaker_sample_rate)
+
+
+def get_agent_settings_bytes(mic_sample_rate=MIC_SR, speaker_sample_rate=SPK_SR):
+    """
+    Get the Deepgram agent settings as UTF-8 encoded JSON bytes
+    
+    Note: websockets sends bytes as a binary frame, which Deepgram treats as
+    audio - use get_agent_settings_json() for the agent WebSocket.
+    
+    Args:
+        mic_sample_rate: Sample rate for microphone input
+        speaker_sample_rate: Sample rate for speaker output
+    
+    Returns:
+        bytes: JSON-encoded Settings message
+    """
+    if mic_sample_rate == MIC_SR and speaker_sample_rate == SPK_SR:
+        return _build()["_DEFAULT_SETTINGS_BYTES"]
+    return get_agent_settings_json(mic_sample_rate, speaker_sample_rate).encode()
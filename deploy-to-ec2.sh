@@ -27,6 +27,12 @@ scp -i "$KEY_PATH" \
     "$LOCAL_DIR/jitb_functions.py" \
     "$LOCAL_DIR/agent_config.py" \
     "$LOCAL_DIR/latency_tracker.py" \
+    "$LOCAL_DIR/combos.json" \
+    "$LOCAL_DIR/prompt_menu.json" \
+    "$LOCAL_DIR/agent_config_functions.json" \
+    "$EC2_USER@$EC2_HOST:$REMOTE_DIR/"
+scp -i "$KEY_PATH" -r \
+    "$LOCAL_DIR/prompts" \
     "$EC2_USER@$EC2_HOST:$REMOTE_DIR/"
 
 echo "   ✓ Python files copied"
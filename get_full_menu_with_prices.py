@@ -6,10 +6,25 @@ This endpoint includes priceAttribute which should give us direct price data!
 
 import os
 import json
+import argparse
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from collections import deque
 from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # optional - falls back to stdlib json
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional - falls back to buffering the whole response
+    ijson = None
+
 load_dotenv()
 
 QU_BASE_URL = "https://gateway-api.qubeyond.com/api/v4"
@@ -18,10 +33,70 @@ QU_SECRET = os.getenv("QU_SECRET")
 CLIENT_ID = "deepgramjitb405"
 X_INTEGRATION = os.getenv("X_INTEGRATION", "682c4b47f7e426d4b8208962")
 
-def get_qu_jwt_token():
-    """Get JWT token for Qu API authentication"""
+TOKEN_CACHE_FILE = ".qu_token_cache.json"
+LOCATION_CACHE_FILE = ".qu_location_cache.json"
+LOCATION_CACHE_TTL = 24 * 60 * 60  # location context rarely changes
+MENU_META_FILE = ".menu_meta.json"  # ETag/Last-Modified of the menu behind PRICES_FILE
+PRICES_FILE = "qu_prices_complete.json"
+RAW_MENU_FILE = "full_menu_with_prices.json"  # debug dump, only written with SAVE_RAW_MENU set
+
+NOT_MODIFIED = "not-modified"  # get_full_menu_with_prices() result for a 304
+
+_EMPTY = ()  # shared stand-in for missing children/prices - no per-node allocation
+
+def json_loads(raw):
+    """Parse JSON bytes (orjson when available - the menu payload can be 300MB)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def write_json(path, obj):
+    """Write obj to path as 2-space indented JSON (atomically - readers never see a partial file)"""
+    tmp_path = f"{path}.tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _load_cache(path, ttl=None):
+    """Read a JSON cache file - None if missing, unreadable, or older than ttl seconds"""
+    try:
+        with open(path, 'rb') as f:
+            cached = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if ttl is not None and time.time() - cached.get("cached_at", 0) > ttl:
+        return None
+    return cached
+
+def _save_cache(path, obj):
+    """Write a cache file readable only by the current user (it may hold a bearer token)"""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode())
+    except OSError as e:
+        print(f"   ⚠️  Could not write {path}: {e}")
+
+def create_session():
+    """One pooled session for auth, location and menu calls - they share a TLS connection"""
+    session = requests.Session()
+    session.headers.update({"X-Integration": X_INTEGRATION})
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount("https://", adapter)
+    return session
+
+def get_qu_jwt_token(session=None):
+    """Get JWT token for Qu API authentication (reused from disk until a minute before expiry)"""
+    cached = _load_cache(TOKEN_CACHE_FILE)
+    if cached and cached.get("exp", 0) - time.time() > 60:
+        return cached.get("access_token")
+    
     try:
-        response = requests.post(
+        response = (session or requests).post(
             f"{QU_BASE_URL}/authentication/oauth2/access-token",
             data={
                 "grant_type": "client_credentials",
@@ -33,16 +108,30 @@ def get_qu_jwt_token():
         )
         response.raise_for_status()
         data = response.json()
-        return data.get("access_token")
+        token = data.get("access_token")
+        if token:
+            _save_cache(TOKEN_CACHE_FILE, {
+                "access_token": token,
+                "exp": time.time() + data.get("expires_in", 3600)
+            })
+        return token
     except Exception as e:
         print(f"❌ Error getting Qu JWT token: {e}")
         return None
 
-def get_location_context(token):
+def get_location_context(token, session=None):
     """
     Get OrderChannelId and OrderTypeId dynamically from location details
+    Cached on disk per LOCATION_ID for LOCATION_CACHE_TTL
     Returns: (order_channel_id, order_type_id)
     """
+    cached = _load_cache(LOCATION_CACHE_FILE, ttl=LOCATION_CACHE_TTL)
+    if cached and cached.get("location_id") == LOCATION_ID:
+        print(f"\n📍 Using cached location context")
+        print(f"   ✅ OrderChannelId: {cached['order_channel_id']}")
+        print(f"   ✅ OrderTypeId: {cached['order_type_id']}")
+        return (cached["order_channel_id"], cached["order_type_id"])
+    
     headers = {
         "Authorization": f"Bearer {token}",
         "X-Integration": X_INTEGRATION,
@@ -58,7 +147,7 @@ def get_location_context(token):
     print(f"\n📍 Getting location context from Qu API...")
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = (session or requests).get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -72,6 +161,12 @@ def get_location_context(token):
             if order_channel_id and order_type_id:
                 print(f"   ✅ OrderChannelId: {order_channel_id}")
                 print(f"   ✅ OrderTypeId: {order_type_id}")
+                _save_cache(LOCATION_CACHE_FILE, {
+                    "location_id": LOCATION_ID,
+                    "order_channel_id": str(order_channel_id),
+                    "order_type_id": str(order_type_id),
+                    "cached_at": time.time()
+                })
                 return (str(order_channel_id), str(order_type_id))
             else:
                 print(f"   ⚠️  Could not extract context from location details")
@@ -84,15 +179,22 @@ def get_location_context(token):
         print(f"   ❌ Error getting location context: {e}")
         return (None, None)
 
-def get_full_menu_with_prices(token, order_channel_id, order_type_id):
+def get_full_menu_with_prices(token, order_channel_id, order_type_id, session=None):
     """
     Get full menu with prices from /api/v4/menus
+    With ijson installed, "children" is a generator of top-level categories parsed
+    as the response streams in, so the full menu is never held in memory
+    Sends If-None-Match/If-Modified-Since from the last saved price map, so an
+    unchanged menu comes back as an empty 304
+    Returns: (menu_data, validators) - menu_data is NOT_MODIFIED on a 304
     """
     headers = {
         "Authorization": f"Bearer {token}",
         "X-Integration": X_INTEGRATION,
         "Content-Type": "application/json",
-        "Accept": "application/json"
+        "Accept": "application/json",
+        # gzip/deflate, plus br when brotli is installed - only what urllib3 can decode
+        "Accept-Encoding": DEFAULT_ACCEPT_ENCODING
     }
     
     # Use dynamically fetched values from location context
@@ -104,92 +206,140 @@ def get_full_menu_with_prices(token, order_channel_id, order_type_id):
     
     url = f"{QU_BASE_URL}/menus"
     
+    # Only revalidate if the price map built from that menu is still on disk
+    meta = _load_cache(MENU_META_FILE)
+    if meta and meta.get("params") == params and os.path.exists(PRICES_FILE):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    
     print(f"\n📍 GET {url}")
     print(f"   Parameters: {params}")
     print(f"   ⚠️  Note: This endpoint can return up to 300MB of data!")
     
     try:
         print(f"\n⏳ Downloading full menu (this may take a moment)...")
-        response = requests.get(url, headers=headers, params=params, timeout=60)
+        response = (session or requests).get(url, headers=headers, params=params, timeout=60, stream=True)
         
         print(f"📥 Response: {response.status_code}")
         
+        if response.status_code == 304:
+            print(f"   ✅ Menu not modified since last run")
+            return (NOT_MODIFIED, None)
+        
         if response.status_code == 200:
-            print(f"   ✅ Success!")
-            print(f"   📦 Response size: {len(response.content) / 1024 / 1024:.2f} MB")
+            print(f"   ✅ Success! (Content-Encoding: {response.headers.get('Content-Encoding', 'identity')})")
+            validators = {
+                "params": params,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
             
-            data = response.json()
+            save_raw = os.getenv("SAVE_RAW_MENU")
+            
+            if ijson is not None and not save_raw:
+                # Parse one top-level category at a time as bytes arrive
+                print(f"   🌊 Streaming menu categories")
+                response.raw.decode_content = True
+                return ({"children": ijson.items(response.raw, "children.item", use_float=True)}, validators)
             
-            # Save to file
-            output_file = "full_menu_with_prices.json"
-            with open(output_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            print(f"   📦 Response size: {len(response.content) / 1024 / 1024:.2f} MB")
+            
+            data = json_loads(response.content)
             
-            print(f"   💾 Saved to: {output_file}")
+            if save_raw:
+                # Already-decoded response bytes - compact, nothing to re-serialize
+                with open(RAW_MENU_FILE, 'wb') as f:
+                    f.write(response.content)
+                print(f"   💾 Saved to: {RAW_MENU_FILE}")
             
-            return data
+            return (data, validators)
         else:
             print(f"❌ Error: {response.status_code}")
             print(f"   {response.text[:500]}")
-            return None
+            if response.status_code == 401:
+                # Cached token was rejected - fetch a fresh one next run
+                try:
+                    os.remove(TOKEN_CACHE_FILE)
+                except OSError:
+                    pass
+            return (None, None)
             
     except Exception as e:
         print(f"❌ Request failed: {e}")
-        return None
+        return (None, None)
 
-def extract_prices_from_menu(menu_data):
+def _extract_subtree(category):
     """
-    Extract prices from full menu data
-    Recursively traverse the tree and extract priceAttribute
+    Extract prices from one top-level category
+    Walks depth-first with an explicit stack - no recursion, so deep menus can't hit
+    RecursionError
+    Returns: (pairs, shown) - (item_path_key, price) in document order, and
+    (title, price) of the first 20 hits
     """
-    price_map = {}
-    count = 0
-    
-    def traverse(item, depth=0):
-        nonlocal count
-        item_path_key = item.get("itemPathKey")
-        title = item.get("title", "")
-        price_attr = item.get("priceAttribute")
+    pairs = []  # dict() of the whole list later sizes the table once
+    shown = []
+    stack = deque([category])
+    pop = stack.pop
+    push = stack.extend
+    add = pairs.append
+    while stack:
+        item = pop()
+        get = item.get
+        item_path_key = get("itemPathKey")
+        price_attr = get("priceAttribute")
         
         if item_path_key and price_attr:
-            # Extract price from priceAttribute.prices array
-            prices_list = price_attr.get("prices", [])
-            if prices_list and len(prices_list) > 0:
-                price_obj = prices_list[0]  # Get first price
-                price = price_obj.get("price", 0.0)
-                price_value_id = price_obj.get("priceValueId")
+            # Extract price from priceAttribute.prices array (first price wins)
+            prices_list = price_attr.get("prices")
+            if prices_list:
+                price = prices_list[0].get("price", 0.0)
                 
                 if price > 0:
                     # Store just the price number (jitb_functions.py expects floats, not objects)
-                    price_map[item_path_key] = price
-                    count += 1
+                    add((item_path_key, price))
                     
-                    if count <= 20:  # Only print first 20
-                        indent = "  " * min(depth, 3)
-                        print(f"{indent}✅ {title[:50]:<50} ${price:.2f}")
-                    elif count == 21:
-                        print(f"   ... ({count-20} more items, suppressing output)")
+                    if len(shown) < 20:
+                        shown.append((get("title", ""), price))
         
-        # Traverse children
-        for child in item.get("children", []):
-            traverse(child, depth + 1)
+        # Push children reversed so they pop in document order
+        push(reversed(get("children") or _EMPTY))
     
-    # Start traversal from root
-    if "children" in menu_data:
-        print("\n📊 Extracting prices from menu tree...")
-        for child in menu_data["children"]:
-            traverse(child)
-    
-    return price_map
+    return (pairs, shown)
 
-def main():
-    print("=" * 80)
-    print("🔍 Get Full Menu with Prices (/api/v4/menus)")
-    print("=" * 80)
+def extract_prices_from_menu(menu_data):
+    """
+    Extract prices from full menu data
+    Walks each top-level category in-process - shipping subtrees to worker processes
+    costs more in pickling than the walk itself
+    """
+    if "children" not in menu_data:
+        return {}
+    
+    print("\n📊 Extracting prices from menu tree...")
+    
+    pairs = []
+    shown = []  # (title, price) of the first 20 hits, printed after the walk
     
+    for category in menu_data["children"]:
+        sub_pairs, sub_shown = _extract_subtree(category)
+        pairs.extend(sub_pairs)
+        if len(shown) < 20:
+            shown.extend(sub_shown[:20 - len(shown)])
+    
+    for title, price in shown:
+        print(f"  ✅ {title[:50]:<50} ${price:.2f}")
+    if len(pairs) > 20:
+        print(f"   ... ({len(pairs)-20} more items, suppressing output)")
+    
+    return dict(pairs)
+
+def refresh_prices(session):
+    """One auth -> location -> menu -> extract -> save pass"""
     # Get authentication token
     print("\n🔐 Authenticating...")
-    token = get_qu_jwt_token()
+    token = get_qu_jwt_token(session)
     
     if not token:
         print("❌ Failed to authenticate")
@@ -198,14 +348,20 @@ def main():
     print("✅ Authenticated")
     
     # Get location context (OrderChannelId and OrderTypeId)
-    order_channel_id, order_type_id = get_location_context(token)
+    order_channel_id, order_type_id = get_location_context(token, session)
     
     if not order_channel_id or not order_type_id:
         print("❌ Failed to get location context")
         return
     
     # Get full menu with prices
-    menu_data = get_full_menu_with_prices(token, order_channel_id, order_type_id)
+    menu_data, validators = get_full_menu_with_prices(token, order_channel_id, order_type_id, session)
+    
+    if menu_data == NOT_MODIFIED:
+        cached = _load_cache(PRICES_FILE) or {}
+        print(f"\n📊 Summary:")
+        print(f"   ✅ Reusing {cached.get('price_count', 0)} prices in {PRICES_FILE} (extracted {cached.get('extracted_at')})")
+        return
     
     if not menu_data:
         print("❌ Failed to get menu data")
@@ -219,28 +375,70 @@ def main():
     
     if len(price_map) > 0:
         # Save price map (this is what jitb_functions.py loads!)
-        output_file = "qu_prices_complete.json"
-        with open(output_file, 'w') as f:
-            json.dump({
-                "extracted_at": datetime.now().isoformat(),
-                "source": "/api/v4/menus (Full Menu with Dynamic Context)",
-                "location_id": LOCATION_ID,
-                "price_count": len(price_map),
-                "prices": price_map
-            }, f, indent=2)
+        output_file = PRICES_FILE
+        write_json(output_file, {
+            "extracted_at": datetime.now().isoformat(),
+            "source": "/api/v4/menus (Full Menu with Dynamic Context)",
+            "location_id": LOCATION_ID,
+            "price_count": len(price_map),
+            "prices": price_map
+        })
         
         print(f"   💾 Saved price map to: {output_file}")
         
+        # Remember which menu version these prices came from for the next conditional GET
+        if validators["etag"] or validators["last_modified"]:
+            _save_cache(MENU_META_FILE, validators)
+        
         # Display sample
         print(f"\n💰 Sample Prices (first 10):")
         print(f"{'Item Path Key':<30} {'Price':<10}")
         print("-" * 42)
         for idx, (item_path_key, price) in enumerate(list(price_map.items())[:10]):
             print(f"{item_path_key:<30} ${price:<9.2f}")
+
+def _positive_interval(value):
+    """argparse type for --watch: a whole number of seconds above zero"""
+    try:
+        seconds = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid interval: {value!r}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f"interval must be > 0 seconds, got {seconds}")
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch Qu menu prices into qu_prices_complete.json")
+    parser.add_argument("--watch", type=_positive_interval, metavar="INTERVAL",
+                        help="keep running and re-check the menu every INTERVAL seconds")
+    args = parser.parse_args()
     
-    print("\n" + "=" * 80)
-    print(f"✅ Complete!")
     print("=" * 80)
+    print("🔍 Get Full Menu with Prices (/api/v4/menus)")
+    print("=" * 80)
+    
+    # Session (and its TLS connection) lives for the whole process - shared across refreshes
+    session = create_session()
+    
+    if not args.watch:
+        refresh_prices(session)
+        print("\n" + "=" * 80)
+        print(f"✅ Complete!")
+        print("=" * 80)
+        return
+    
+    print(f"\n👀 Watch mode: re-checking the menu every {args.watch}s (Ctrl+C to stop)")
+    try:
+        while True:
+            try:
+                refresh_prices(session)
+            except Exception as e:
+                # Keep the daemon alive - the next pass retries
+                print(f"❌ Refresh failed: {e}")
+            print(f"\n💤 Next check in {args.watch}s ({datetime.now().isoformat(timespec='seconds')})")
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
 
 if __name__ == "__main__":
     main()
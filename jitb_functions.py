@@ -4,55 +4,105 @@ Connects to Rust backend server for real menu data from Qu API
 """
 
 import json
+import functools
+import re
+import mmap
+import pickle
 import uuid
 import os
+import sys
+import time
+import threading
 import requests
-from typing import List, Dict, Any
+from collections import OrderedDict, deque
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 from latency_tracker import start_timer, end_timer
 from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:  # optional - falls back to stdlib json
+    orjson = None
 
 load_dotenv()
 
+
+# Function results are read by the agent, not people - compact JSON unless JITB_PRETTY_JSON=1 (local debugging)
+PRETTY_JSON = os.getenv("JITB_PRETTY_JSON") == "1"
+
+
+def _dumps(obj) -> str:
+    """Serialize a function result to JSON text (orjson when available; indented only with PRETTY_JSON)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if PRETTY_JSON else 0).decode()
+    return json.dumps(obj, indent=2 if PRETTY_JSON else None)
+
+
+def _json_body(response):
+    """Decode a backend response straight from its bytes body (orjson when available)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            pass  # let requests raise its own JSONDecodeError so callers' RequestException handling still applies
+    return response.json()
+
+
 # Conversation log file
 CONVERSATION_LOG_DIR = Path("conversation_logs")
 CONVERSATION_LOG_DIR.mkdir(exist_ok=True)
 CURRENT_LOG_FILE = None
+_LOG_FH = None  # open (line-buffered) handle to CURRENT_LOG_FILE for the whole conversation
+# Logs keep the readable banner/entry layout unless JITB_LOG_JSONL=1 (one JSON object per line, for jq)
+LOG_JSONL = os.getenv("JITB_LOG_JSONL") == "1"
+
+def _log_json(obj, indent: bool) -> str:
+    """Serialize a log record or Data block (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, indent=2 if indent else None)
 
 def log_event(event_type: str, details: str = "", data: dict = None):
     """Log conversation events to file"""
-    global CURRENT_LOG_FILE
-    
-    if CURRENT_LOG_FILE is None:
+    if _LOG_FH is None:
         return
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     
-    log_entry = f"[{timestamp}] {event_type}"
-    if details:
-        log_entry += f" - {details}"
-    if data:
-        log_entry += f"\n    Data: {json.dumps(data, indent=4)}"
-    log_entry += "\n"
-    
     try:
-        with open(CURRENT_LOG_FILE, 'a') as f:
-            f.write(log_entry)
+        if LOG_JSONL:
+            log_entry = _log_json({"ts": timestamp, "event": event_type, "details": details, "data": data}, False) + "\n"
+        else:
+            log_entry = f"[{timestamp}] {event_type}"
+            if details:
+                log_entry += f" - {details}"
+            if data:
+                log_entry += f"\n    Data: {_log_json(data, True)}"
+            log_entry += "\n"
+        _LOG_FH.write(log_entry)
     except Exception as e:
         print(f"Error writing to log: {e}")
 
 def start_conversation_log():
-    """Start a new conversation log file"""
-    global CURRENT_LOG_FILE
+    """Start a new conversation log file (kept open until end_conversation_log)"""
+    global CURRENT_LOG_FILE, _LOG_FH
+    if _LOG_FH is not None:
+        _LOG_FH.close()
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     CURRENT_LOG_FILE = CONVERSATION_LOG_DIR / f"conversation_{timestamp}.log"
     
-    with open(CURRENT_LOG_FILE, 'w') as f:
-        f.write("=" * 80 + "\n")
-        f.write(f"JACK IN THE BOX VOICE AGENT - CONVERSATION LOG\n")
-        f.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 80 + "\n\n")
+    _LOG_FH = open(CURRENT_LOG_FILE, 'w', buffering=1)
+    if not LOG_JSONL:
+        _LOG_FH.write("=" * 80 + "\n")
+        _LOG_FH.write(f"JACK IN THE BOX VOICE AGENT - CONVERSATION LOG\n")
+        _LOG_FH.write(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        _LOG_FH.write("=" * 80 + "\n\n")
     
     log_event("CONVERSATION_START", "New conversation initiated")
     print(f"📝 Started conversation log: {CURRENT_LOG_FILE}")
@@ -60,31 +110,77 @@ def start_conversation_log():
 
 def end_conversation_log():
     """End the current conversation log"""
-    global CURRENT_LOG_FILE
+    global CURRENT_LOG_FILE, _LOG_FH
     
-    if CURRENT_LOG_FILE:
+    if _LOG_FH is not None:
         log_event("CONVERSATION_END", "Conversation ended")
-        with open(CURRENT_LOG_FILE, 'a') as f:
-            f.write("\n" + "=" * 80 + "\n")
-            f.write(f"Ended: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 80 + "\n")
+        if not LOG_JSONL:
+            _LOG_FH.write("\n" + "=" * 80 + "\n")
+            _LOG_FH.write(f"Ended: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            _LOG_FH.write("=" * 80 + "\n")
+        _LOG_FH.close()
+        _LOG_FH = None
         print(f"📝 Ended conversation log: {CURRENT_LOG_FILE}")
         CURRENT_LOG_FILE = None
 
 # Rust backend server URL
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:4000")
 
+# Shared keep-alive session for the Rust backend and Qu API - no TCP/TLS setup per call.
+# Retry only covers connection failures for POSTs (urllib3 never re-sends a POST once it's out);
+# the startup GET /menu is also retried on gateway errors from the backend.
+# Content-Type is left per-request: the Qu token call is form-encoded.
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept": "application/json"})
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+)
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
 # Cached menu data (loaded at startup)
 cached_categories = []
 cached_menu = {}  # { "burgers": [...items...], "breakfast items": [...items...], ... }
+cached_menu_by_path = {}  # { "itemPathKey": item } - flat view of cached_menu, rebuilt by _index_categories
 cached_modifiers = {}  # { "itemPathKey": {"name": "...", "price": ...}, ... } - populated from query_modifiers results
 
+# Opt-in on-disk snapshot of the walked menu so restarts skip the backend fetch + tree walk.
+# Reused while younger than MENU_CACHE_TTL seconds and newer than qu_prices_complete.json.
+# Off by default (0): a backend menu reload doesn't touch either file, so a snapshot
+# can outlive the menu it was built from - restart-qu.sh deletes it
+MENU_CACHE_FILE = Path("menu_cache.pkl")
+MENU_CACHE_TTL = int(os.getenv("MENU_CACHE_TTL", "0"))
+
+# Category name indexes over cached_menu, rebuilt by load_menu_categories()
+_category_lookup: Dict[str, str] = {}  # { "burgers": "Burgers", ... } - exact case-insensitive match
+_category_tokens: List[Tuple[str, str]] = []  # [("burgers", "Burgers"), ...] - fuzzy fallback, menu order
+
+def _load_qu_prices(path: str = 'qu_prices_complete.json') -> Dict[str, float]:
+    """
+    Parse the price map straight out of a read-only mmap of the file (no copy into a bytes buffer)
+    
+    86k entries share only a few hundred distinct prices, so each distinct price is boxed once
+    and every entry points at it; keys are interned so menu/order strings can share them
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if orjson is not None:
+            with memoryview(mm) as view:
+                price_data = orjson.loads(view)
+        else:
+            price_data = json.loads(mm[:])
+    
+    boxed = {}
+    box = boxed.setdefault
+    intern = sys.intern
+    return {intern(key): box(price, price) for key, price in price_data.get('prices', {}).items()}
+
+
 # Load COMPLETE Qu prices (86,115 items with real prices from Qu API!)
 QU_PRICES = {}
 try:
-    with open('qu_prices_complete.json', 'r') as f:
-        price_data = json.load(f)
-        QU_PRICES = price_data.get('prices', {})
+    QU_PRICES = _load_qu_prices()
     print(f"✅ Loaded {len(QU_PRICES)} real Qu prices from qu_prices_complete.json")
 except Exception as e:
     print(f"⚠️  Could not load qu_prices_complete.json: {e}")
@@ -92,12 +188,14 @@ except Exception as e:
     QU_PRICES = {}
 
 
+@functools.lru_cache(maxsize=8192)
 def get_price_by_item_path_key(item_path_key: str, item_name: str = "") -> float:
     """
     Get real Qu price for an item by itemPathKey
     
     Uses complete price data from /api/v4/menus (86,115 items)
     Fallback: $0.00 for items not found (likely included modifiers)
+    Memoized - QU_PRICES is fixed after import, and a missing key is only reported once
     """
     # Try to get real Qu price
     price = QU_PRICES.get(item_path_key)
@@ -113,6 +211,103 @@ def get_price_by_item_path_key(item_path_key: str, item_name: str = "") -> float
     return 0.0
 
 
+def _any_of(*words):
+    """Precompiled single-pass substring test for any of the given words"""
+    return re.compile("|".join(re.escape(word) for word in words))
+
+
+# Price overrides by category/key for estimate_price_from_name - the defaults live in _PRICE_RULES
+fallback_prices: Dict[str, Dict[str, float]] = {}
+
+# fallback_prices flattened once to {(category, key): price} - one probe, no empty-dict allocation on a miss
+_FLAT_PRICES = MappingProxyType({
+    (category, key): price
+    for category, prices in fallback_prices.items()
+    for key, price in prices.items()
+})
+
+# estimate_price_from_name decision table, checked in order (first hit wins):
+# (category keywords, excluded keywords, category, ((all-of keyword sets, key, default price), ...))
+# Every category ends with a catch-all () rule
+_PRICE_RULES = (
+    (_any_of("combo"), None, "combos", (
+        ((_any_of("value"),), "value", 8.99),
+        ((_any_of("premium", "ultimate"),), "premium", 12.99),
+        ((), "default", 10.99),
+    )),
+    (_any_of("breakfast", "croissant", "burrito"), None, "breakfast", (
+        ((_any_of("breakfast jack"),), "breakfast_jack", 3.99),
+        ((_any_of("sausage croissant"),), "sausage_croissant", 4.99),
+        ((_any_of("burrito"),), "grande_sausage_burrito", 5.49),
+        ((_any_of("hash brown"),), "hash_browns", 2.49),
+        ((), "default", 5.99),
+    )),
+    (_any_of("burger", "jack"), None, "burgers", (
+        ((_any_of("jumbo jack"),), "jumbo_jack", 5.99),
+        ((_any_of("double jack"),), "double_jack", 7.99),
+        ((_any_of("sourdough"),), "sourdough_jack", 8.49),
+        ((_any_of("buttery"),), "buttery_jack", 8.99),
+        ((_any_of("bacon ultimate"),), "bacon_ultimate_cheeseburger", 9.49),
+        ((), "default", 7.99),
+    )),
+    (_any_of("chicken"), _any_of("sandwich"), "chicken", (
+        ((_any_of("strips"), _any_of("6")), "chicken_strips_6pc", 9.49),
+        ((_any_of("strips"),), "chicken_strips_4pc", 6.99),
+        ((_any_of("nuggets"), _any_of("10")), "chicken_nuggets_10pc", 7.99),
+        ((_any_of("nuggets"),), "chicken_nuggets_5pc", 4.99),
+        ((_any_of("popcorn"),), "popcorn_chicken", 5.99),
+        ((), "default", 6.99),
+    )),
+    (_any_of("sandwich"), None, "sandwiches", (
+        ((_any_of("spicy"),), "spicy_chicken", 8.49),
+        ((_any_of("grilled"),), "grilled_chicken", 8.99),
+        ((_any_of("club"),), "chicken_club", 9.49),
+        ((), "default", 8.49),
+    )),
+    (_any_of("taco"), None, "tacos", (
+        ((_any_of("monster"),), "monster_taco", 1.99),
+        ((_any_of("tiny"),), "tiny_tacos_15pc", 4.99),
+        ((), "default", 1.49),
+    )),
+    (_any_of("salad"), None, "salads", (
+        ((_any_of("side"),), "side_salad", 3.99),
+        ((), "default", 8.99),
+    )),
+    (_any_of("fries", "curly", "onion ring", "egg roll", "mozzarella", "jalapeno"), None, "sides", (
+        ((_any_of("curly"), _any_of("large")), "curly_fries_large", 3.49),
+        ((_any_of("curly"), _any_of("medium")), "curly_fries_medium", 2.99),
+        ((_any_of("curly"),), "curly_fries_small", 2.49),
+        ((_any_of("onion"),), "onion_rings", 3.49),
+        ((_any_of("egg roll"),), "egg_rolls_3pc", 3.99),
+        ((_any_of("mozzarella"),), "mozzarella_sticks", 4.99),
+        ((_any_of("jalapeno"),), "stuffed_jalapenos_3pc", 3.99),
+        ((), "default", 2.99),
+    )),
+    (_any_of("drink", "soda", "coke", "pepsi", "sprite", "shake", "coffee", "lemonade", "tea"), None, "drinks", (
+        ((_any_of("shake"), _any_of("large")), "shake_large", 4.99),
+        ((_any_of("shake"), _any_of("medium")), "shake_medium", 4.29),
+        ((_any_of("shake"),), "shake_small", 3.49),
+        ((_any_of("coffee"), _any_of("iced")), "iced_coffee", 2.99),
+        ((_any_of("coffee"),), "hot_coffee", 2.29),
+        ((_any_of("lemonade"),), "lemonade", 2.49),
+        ((_any_of("tea"),), "iced_tea", 2.29),
+        # Generic soda
+        ((_any_of("large"),), "soda_large", 2.69),
+        ((_any_of("medium"),), "soda_medium", 2.29),
+        ((), "soda_small", 1.99),
+    )),
+    (_any_of("dessert", "churro", "cheesecake", "turnover", "cake", "pie"), None, "desserts", (
+        ((_any_of("churro"),), "mini_churros", 2.49),
+        ((_any_of("cheesecake"),), "cheesecake", 3.49),
+        ((_any_of("turnover"),), "apple_turnover", 1.99),
+        ((_any_of("chocolate"),), "chocolate_cake", 3.99),
+        ((_any_of("pie"),), "pie_slice", 2.49),
+        ((), "default", 2.99),
+    )),
+)
+
+
+@functools.lru_cache(maxsize=4096)
 def estimate_price_from_name(item_name: str) -> float:
     """
     DEPRECATED: Legacy function kept for backward compatibility
@@ -120,179 +315,138 @@ def estimate_price_from_name(item_name: str) -> float:
     """
     item_name_lower = item_name.lower()
     
-    # Check for combo meals first (most expensive category)
-    if "combo" in item_name_lower:
-        # Try to find specific combo type
-        if "value" in item_name_lower:
-            return fallback_prices.get("combos", {}).get("value", 8.99)
-        elif "premium" in item_name_lower or "ultimate" in item_name_lower:
-            return fallback_prices.get("combos", {}).get("premium", 12.99)
-        else:
-            return fallback_prices.get("combos", {}).get("default", 10.99)
-    
-    # Check for breakfast items
-    if "breakfast" in item_name_lower or "croissant" in item_name_lower or "burrito" in item_name_lower:
-        breakfast_prices = fallback_prices.get("breakfast", {})
-        # Try to match specific items
-        if "breakfast jack" in item_name_lower:
-            return breakfast_prices.get("breakfast_jack", 3.99)
-        elif "sausage croissant" in item_name_lower:
-            return breakfast_prices.get("sausage_croissant", 4.99)
-        elif "burrito" in item_name_lower:
-            return breakfast_prices.get("grande_sausage_burrito", 5.49)
-        elif "hash brown" in item_name_lower:
-            return breakfast_prices.get("hash_browns", 2.49)
-        else:
-            return breakfast_prices.get("default", 5.99)
-    
-    # Check for burgers
-    if "burger" in item_name_lower or "jack" in item_name_lower:
-        burger_prices = fallback_prices.get("burgers", {})
-        # Try to match specific burgers
-        if "jumbo jack" in item_name_lower:
-            return burger_prices.get("jumbo_jack", 5.99)
-        elif "double jack" in item_name_lower:
-            return burger_prices.get("double_jack", 7.99)
-        elif "sourdough" in item_name_lower:
-            return burger_prices.get("sourdough_jack", 8.49)
-        elif "buttery" in item_name_lower:
-            return burger_prices.get("buttery_jack", 8.99)
-        elif "bacon ultimate" in item_name_lower:
-            return burger_prices.get("bacon_ultimate_cheeseburger", 9.49)
-        else:
-            return burger_prices.get("default", 7.99)
-    
-    # Check for chicken
-    if "chicken" in item_name_lower and "sandwich" not in item_name_lower:
-        chicken_prices = fallback_prices.get("chicken", {})
-        if "strips" in item_name_lower:
-            if "6" in item_name_lower:
-                return chicken_prices.get("chicken_strips_6pc", 9.49)
-            else:
-                return chicken_prices.get("chicken_strips_4pc", 6.99)
-        elif "nuggets" in item_name_lower:
-            if "10" in item_name_lower:
-                return chicken_prices.get("chicken_nuggets_10pc", 7.99)
-            else:
-                return chicken_prices.get("chicken_nuggets_5pc", 4.99)
-        elif "popcorn" in item_name_lower:
-            return chicken_prices.get("popcorn_chicken", 5.99)
-        else:
-            return chicken_prices.get("default", 6.99)
-    
-    # Check for sandwiches (including chicken sandwiches)
-    if "sandwich" in item_name_lower:
-        sandwich_prices = fallback_prices.get("sandwiches", {})
-        if "spicy" in item_name_lower:
-            return sandwich_prices.get("spicy_chicken", 8.49)
-        elif "grilled" in item_name_lower:
-            return sandwich_prices.get("grilled_chicken", 8.99)
-        elif "club" in item_name_lower:
-            return sandwich_prices.get("chicken_club", 9.49)
-        else:
-            return sandwich_prices.get("default", 8.49)
-    
-    # Check for tacos
-    if "taco" in item_name_lower:
-        taco_prices = fallback_prices.get("tacos", {})
-        if "monster" in item_name_lower:
-            return taco_prices.get("monster_taco", 1.99)
-        elif "tiny" in item_name_lower:
-            return taco_prices.get("tiny_tacos_15pc", 4.99)
-        else:
-            return taco_prices.get("default", 1.49)
-    
-    # Check for salads
-    if "salad" in item_name_lower:
-        salad_prices = fallback_prices.get("salads", {})
-        if "side" in item_name_lower:
-            return salad_prices.get("side_salad", 3.99)
-        else:
-            return salad_prices.get("default", 8.99)
-    
-    # Check for sides
-    if any(word in item_name_lower for word in ["fries", "curly", "onion ring", "egg roll", "mozzarella", "jalapeno"]):
-        sides_prices = fallback_prices.get("sides", {})
-        if "curly" in item_name_lower:
-            if "large" in item_name_lower:
-                return sides_prices.get("curly_fries_large", 3.49)
-            elif "medium" in item_name_lower:
-                return sides_prices.get("curly_fries_medium", 2.99)
-            else:
-                return sides_prices.get("curly_fries_small", 2.49)
-        elif "onion" in item_name_lower:
-            return sides_prices.get("onion_rings", 3.49)
-        elif "egg roll" in item_name_lower:
-            return sides_prices.get("egg_rolls_3pc", 3.99)
-        elif "mozzarella" in item_name_lower:
-            return sides_prices.get("mozzarella_sticks", 4.99)
-        elif "jalapeno" in item_name_lower:
-            return sides_prices.get("stuffed_jalapenos_3pc", 3.99)
-        else:
-            return sides_prices.get("default", 2.99)
-    
-    # Check for drinks
-    if any(word in item_name_lower for word in ["drink", "soda", "coke", "pepsi", "sprite", "shake", "coffee", "lemonade", "tea"]):
-        drink_prices = fallback_prices.get("drinks", {})
-        if "shake" in item_name_lower:
-            if "large" in item_name_lower:
-                return drink_prices.get("shake_large", 4.99)
-            elif "medium" in item_name_lower:
-                return drink_prices.get("shake_medium", 4.29)
-            else:
-                return drink_prices.get("shake_small", 3.49)
-        elif "coffee" in item_name_lower:
-            if "iced" in item_name_lower:
-                return drink_prices.get("iced_coffee", 2.99)
-            else:
-                return drink_prices.get("hot_coffee", 2.29)
-        elif "lemonade" in item_name_lower:
-            return drink_prices.get("lemonade", 2.49)
-        elif "tea" in item_name_lower:
-            return drink_prices.get("iced_tea", 2.29)
-        else:
-            # Generic soda
-            if "large" in item_name_lower:
-                return drink_prices.get("soda_large", 2.69)
-            elif "medium" in item_name_lower:
-                return drink_prices.get("soda_medium", 2.29)
-            else:
-                return drink_prices.get("soda_small", 1.99)
-    
-    # Check for desserts
-    if any(word in item_name_lower for word in ["dessert", "churro", "cheesecake", "turnover", "cake", "pie"]):
-        dessert_prices = fallback_prices.get("desserts", {})
-        if "churro" in item_name_lower:
-            return dessert_prices.get("mini_churros", 2.49)
-        elif "cheesecake" in item_name_lower:
-            return dessert_prices.get("cheesecake", 3.49)
-        elif "turnover" in item_name_lower:
-            return dessert_prices.get("apple_turnover", 1.99)
-        elif "chocolate" in item_name_lower:
-            return dessert_prices.get("chocolate_cake", 3.99)
-        elif "pie" in item_name_lower:
-            return dessert_prices.get("pie_slice", 2.49)
-        else:
-            return dessert_prices.get("default", 2.99)
+    for category_match, category_exclude, category, rules in _PRICE_RULES:
+        if not category_match.search(item_name_lower):
+            continue
+        if category_exclude is not None and category_exclude.search(item_name_lower):
+            continue
+        for keywords, key, default in rules:
+            if all(keyword.search(item_name_lower) for keyword in keywords):
+                return _FLAT_PRICES.get((category, key), default)
     
     # Default fallback
     return 8.99
 
 
+def _index_categories():
+    """Rebuild the lowercase category indexes used by get_category_items and the itemPathKey index used by add_item"""
+    global _category_lookup, _category_tokens, cached_menu_by_path
+    
+    _category_tokens = [(cat_name.lower(), cat_name) for cat_name in cached_menu]
+    lookup = {}
+    for cat_lower, cat_name in _category_tokens:
+        lookup.setdefault(cat_lower, cat_name)  # first match wins, as with the old scan
+    _category_lookup = lookup
+    
+    by_path = {}
+    for items in cached_menu.values():
+        for item in items:
+            by_path.setdefault(item["itemPathKey"], item)  # first category wins, as with the old scan
+    cached_menu_by_path = by_path
+
+
+_SKIP_TITLE_PREFIXES = ("Mod -", "Modifier -")
+_EMPTY = ()  # shared stand-in for missing children - no per-leaf allocation
+_NO_ATTRIBUTES = MappingProxyType({})
+
+
+def _extract_items(root, desserts=None):
+    """
+    Yield the priced items under a menu tree node as cached_menu entries, depth-first in menu
+    order (no recursion). "Dessert -" items are also appended to desserts when given
+    
+    Runs once per menu node at startup, so lookups are bound to locals and prices are read
+    from QU_PRICES directly instead of through get_price_by_item_path_key
+    """
+    stack = deque([root])
+    pop = stack.pop
+    push = stack.extend
+    price_of = QU_PRICES.get
+    while stack:
+        node = pop()
+        get = node.get
+        
+        title = get("title")
+        
+        # Skip empty titles and modifiers ("Mod -" / "Modifier -") along with their subtrees
+        if not title or title.startswith(_SKIP_TITLE_PREFIXES):
+            continue
+        
+        # Yield current item if it has an itemPathKey (leaf node with actual product)
+        item_path_key = get("itemPathKey")
+        if item_path_key:
+            price = price_of(item_path_key)
+            
+            # Skip unpriced and $0.00 items (system/internal items)
+            if price is not None and price > 0:
+                entry = {
+                    "name": title,
+                    "itemPathKey": item_path_key,
+                    "price": float(price),
+                    "description": (get("displayAttribute") or _NO_ATTRIBUTES).get("description", "")
+                }
+                if desserts is not None and title.startswith("Dessert -"):
+                    desserts.append(entry)
+                yield entry
+        
+        # Push children reversed so they pop in menu order
+        push(reversed(get("children") or _EMPTY))
+
+
+def _load_menu_snapshot():
+    """Return (categories, menu) from MENU_CACHE_FILE if it's still fresh, else None"""
+    if MENU_CACHE_TTL <= 0:
+        return None
+    try:
+        snapshot_mtime = MENU_CACHE_FILE.stat().st_mtime
+        if time.time() - snapshot_mtime > MENU_CACHE_TTL:
+            return None
+        # Prices are baked into the menu entries - a newer price file invalidates the snapshot
+        prices_file = Path('qu_prices_complete.json')
+        if prices_file.exists() and prices_file.stat().st_mtime > snapshot_mtime:
+            return None
+        with open(MENU_CACHE_FILE, 'rb') as f:
+            backend_url, categories, menu = pickle.load(f)
+        if backend_url != BACKEND_URL:
+            return None
+        return categories, menu
+    except Exception:
+        return None
+
+
+def _save_menu_snapshot():
+    """Write cached_categories/cached_menu to MENU_CACHE_FILE (atomically)"""
+    tmp_path = MENU_CACHE_FILE.with_suffix(".tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((BACKEND_URL, cached_categories, cached_menu), f, protocol=5)
+        os.replace(tmp_path, MENU_CACHE_FILE)
+    except Exception as e:
+        print(f"⚠️  Could not write {MENU_CACHE_FILE}: {e}")
+
+
 def load_menu_categories():
     """Load the full menu at startup and cache both categories and items for faster responses"""
     global cached_categories, cached_menu
     
+    snapshot = _load_menu_snapshot()
+    if snapshot:
+        cached_categories, cached_menu = snapshot
+        _index_categories()
+        print(f"✅ Loaded {len(cached_categories)} categories from {MENU_CACHE_FILE} (skipping backend fetch)")
+        return
+    
     try:
         print("📋 Loading FULL menu from cached Qu API data...")
         
         # Get FULL cached menu from Rust backend (includes ALL items in tree structure)
-        response = requests.get(
+        response = _SESSION.get(
             f"{BACKEND_URL}/menu",
             timeout=15
         )
         response.raise_for_status()
-        menu_data = response.json()
+        # Decoding the full menu tree dominates startup CPU - the walk below is ~1ms per few thousand nodes
+        menu_data = _json_body(response)
         
         # Extract categories from the hierarchical menu structure
         categories = menu_data.get("value", {}).get("categories", [])
@@ -303,47 +457,9 @@ def load_menu_categories():
         
         print(f"   Found {len(categories)} top-level categories from Qu")
         
-        # Recursively extract all items from the tree structure
-        def extract_items(node, depth=0):
-            """Recursively extract items from the menu tree"""
-            items_list = []
-            
-            title = node.get("title", "")
-            item_path_key = node.get("itemPathKey", "")
-            description = node.get("displayAttribute", {}).get("description", "")
-            
-            # Skip empty titles
-            if not title:
-                return items_list
-            
-            # Skip modifiers (they start with "Mod -" or "Modifier -")
-            if title.startswith("Mod -") or title.startswith("Modifier -"):
-                return items_list
-            
-            # Add current item if it has an itemPathKey (leaf node with actual product)
-            if item_path_key:
-                # Get price
-                price = get_price_by_item_path_key(item_path_key, title)
-                
-                # Skip items with $0.00 price (system/internal items)
-                if price > 0:
-                    items_list.append({
-                        "title": title,
-                        "itemPathKey": item_path_key,
-                        "price": price,
-                        "description": description
-                    })
-            
-            # Recursively process children
-            children = node.get("children", [])
-            for child in children:
-                items_list.extend(extract_items(child, depth + 1))
-            
-            return items_list
-        
         # Organize items by Qu's EXACT top-level categories
         temp_menu = {}
-        categories_set = set()
+        dessert_items = []  # shared references for the virtual "Desserts" category (items are read-only after load)
         
         for category_node in categories:
             category_title = category_node.get("title", "")
@@ -351,43 +467,25 @@ def load_menu_categories():
                 continue
             
             # Extract all items from this category
-            category_items = extract_items(category_node)
+            category_items = list(_extract_items(category_node, dessert_items))
             
             if category_items:  # Only add if it has items with prices
-                categories_set.add(category_title)
-                temp_menu[category_title] = []
-                
-                for item in category_items:
-                    temp_menu[category_title].append({
-                        "name": item.get("title", ""),
-                    "itemPathKey": item.get("itemPathKey", ""),
-                    "price": item.get("price", 0.0),
-                    "description": item.get("description", "")
-                })
+                temp_menu[category_title] = category_items
         
-        # Use Qu's category order (don't sort alphabetically)
-        cached_categories = list(categories_set)
+        # Use Qu's category order (don't sort alphabetically) - dicts keep insertion order, sets don't
+        cached_categories = list(temp_menu)
         cached_menu = temp_menu
         
-        # Create virtual "Desserts" category by extracting all dessert items
-        dessert_items = []
-        for category_name, category_items in temp_menu.items():
-            if not isinstance(category_items, list):
-                continue
-            for item in category_items:
-                if not isinstance(item, dict):
-                    continue
-                item_name = item.get("name", "")
-                if isinstance(item_name, str) and item_name.startswith("Dessert -"):
-                    # Create a copy to avoid modifying the original
-                    dessert_items.append(item.copy())
-        
-        # Add Desserts category if we found any dessert items
+        # Add virtual Desserts category if we found any dessert items
         if dessert_items:
             cached_menu["Desserts"] = dessert_items
             cached_categories.append("Desserts")
             print(f"   ✨ Created virtual 'Desserts' category with {len(dessert_items)} items")
         
+        _index_categories()
+        if MENU_CACHE_TTL > 0:
+            _save_menu_snapshot()
+        
         # Print summary
         total_items = sum(len(items) for items in cached_menu.values())
         print(f"✅ Loaded {len(cached_categories)} categories with {total_items} items:")
@@ -402,17 +500,18 @@ def load_menu_categories():
         print("   Using default categories")
         cached_categories = ["Breakfast", "Lunch/Dinner", "Snacks, Sides & Extras", "Drinks", "Kid's Meals", "Late Night & LTOs", "Extras"]
         cached_menu = {}
+        _index_categories()
 
 
 def get_menu_categories() -> str:
     """Get cached menu categories (fast!)"""
     if not cached_categories:
-        return json.dumps({
+        return _dumps({
             "categories": ["Breakfast", "Lunch/Dinner", "Snacks, Sides & Extras", "Drinks", "Kid's Meals", "Late Night & LTOs", "Extras"],
             "cached": False
         })
     
-    return json.dumps({
+    return _dumps({
         "categories": cached_categories,
         "cached": True
     })
@@ -421,18 +520,13 @@ def get_menu_categories() -> str:
 def get_category_items(category: str) -> str:
     """Get cached items for a specific category (instant!)"""
     # Try exact match first (case-insensitive)
-    category_match = None
     category_lower = category.lower().strip()
-    
-    for cat_name in cached_menu.keys():
-        if cat_name.lower() == category_lower:
-            category_match = cat_name
-            break
+    category_match = _category_lookup.get(category_lower)
     
     # If no exact match, try fuzzy matching
     if not category_match:
-        for cat_name in cached_menu.keys():
-            if category_lower in cat_name.lower() or cat_name.lower() in category_lower:
+        for cat_lower, cat_name in _category_tokens:
+            if category_lower in cat_lower or cat_lower in category_lower:
                 category_match = cat_name
                 break
     
@@ -440,7 +534,7 @@ def get_category_items(category: str) -> str:
     items = cached_menu.get(category_match, []) if category_match else []
     
     if not items:
-        return json.dumps({
+        return _dumps({
             "success": False,
             "category": category,
             "items": [],
@@ -448,7 +542,7 @@ def get_category_items(category: str) -> str:
             "cached": True
         })
     
-    return json.dumps({
+    return _dumps({
         "success": True,
         "category": category_lower,
         "items": items,
@@ -659,19 +753,42 @@ MODIFIERS = {
     },
 }
 
+# Lowercased names of the mock fallback data, computed once for the query_* fallbacks
+_MENU_ITEMS_LOWER = [(item["name"].lower(), item) for item in MENU_ITEMS.values()]
+_MODIFIERS_LOWER = [(mod["name"].lower(), mod) for mod in MODIFIERS.values()]
+
 # Current order (in-memory)
 current_order: List[Dict[str, Any]] = []
+current_order_index: Dict[str, Dict[str, Any]] = {}  # itemId -> entry in current_order
+_combo_slots: Dict[str, Dict[str, Dict[str, Any]]] = {}  # itemId -> {"side"/"drink": modifier on that item} - kept out of order() output
+_DEBUG_ORDER = os.getenv("JITB_DEBUG_ORDER") == "1"  # print add_modifier pricing decisions and the per-item breakdown on submit_order_to_qu
+_order_total: float = 0.0  # running sum of current_order prices - kept in step at every add/delete/modifier change
 qu_order_id: str = None  # Store Qu order ID when submitted
 
+# Qu JWT reused until 30s before expiry (functions run on executor threads, hence the lock)
+_JWT_TOKEN = None
+_JWT_EXPIRES_AT = 0.0
+_JWT_LOCK = threading.Lock()
+
 
 def get_qu_jwt_token() -> str:
-    """Get JWT token from Qu API for authentication"""
+    """Get JWT token from Qu API for authentication (cached until shortly before it expires)"""
+    with _JWT_LOCK:
+        if _JWT_TOKEN and time.monotonic() < _JWT_EXPIRES_AT - 30:
+            return _JWT_TOKEN
+        return _fetch_qu_jwt_token()
+
+
+def _fetch_qu_jwt_token() -> str:
+    """OAuth2 client-credentials round trip; caller holds _JWT_LOCK"""
+    global _JWT_TOKEN, _JWT_EXPIRES_AT
+    
     try:
         qu_secret = os.getenv("QU_SECRET")
         if not qu_secret:
             raise Exception("QU_SECRET not found in environment")
         
-        response = requests.post(
+        response = _SESSION.post(
             "https://gateway-api.qubeyond.com/api/v4/authentication/oauth2/access-token",
             data={
                 "grant_type": "client_credentials",
@@ -683,7 +800,9 @@ def get_qu_jwt_token() -> str:
         )
         response.raise_for_status()
         data = response.json()
-        return data.get("access_token")
+        _JWT_TOKEN = data.get("access_token")
+        _JWT_EXPIRES_AT = time.monotonic() + data.get("expires_in", 3600)
+        return _JWT_TOKEN
     except Exception as e:
         print(f"Error getting Qu JWT token: {e}")
         return None
@@ -693,45 +812,30 @@ def submit_order_to_qu() -> str:
     """Submit the current order to Qu API (or simulate submission)"""
     log_event("FUNCTION_CALL", f"submit_order_to_qu", {"items_count": len(current_order)})
     if not current_order:
-        return json.dumps({
+        return _dumps({
             "success": False,
             "message": "Cannot submit empty order"
         })
     
-    # Calculate total (item prices already include modifier prices from add_modifier)
-    print("\n💰 Calculating order total:")
-    total = 0
-    for idx, item in enumerate(current_order, 1):
-        item_price = item.get("price", 8.99)
-        item_name = item.get('name') or item.get('itemName', 'Item')
-        print(f"   {idx}. {item_name}: ${item_price:.2f}")
-        
-        # Modifiers should already be included in item price
-        if item.get('modifiers'):
-            for mod in item['modifiers']:
-                mod_price = mod.get('price', 0)
-                print(f"      + {mod.get('name', 'Modifier')}: ${mod_price:.2f} (already included in item price)")
-        
-        total += item_price
-    
-    print(f"   TOTAL: ${total:.2f}\n")
+    # Total is kept incrementally (item prices already include modifier prices from add_modifier)
+    total = _order_total
     
     # Generate order ID
     global qu_order_id
     qu_order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
     
-    # Log the order (for demo purposes)
-    print(f"\n📋 Order Summary:")
-    print(f"   Order ID: {qu_order_id}")
-    print(f"   Items: {len(current_order)}")
-    for idx, item in enumerate(current_order, 1):
-        # Get item name (check both 'name' and 'itemName' fields)
-        item_name = item.get('name') or item.get('itemName', 'Item')
-        print(f"   {idx}. {item_name} (${item.get('price', 8.99):.2f})")
-        if item.get('modifiers'):
-            for mod in item['modifiers']:
-                print(f"      + {mod.get('name', 'Modifier')}")
-    print(f"   Total: ${total:.2f}\n")
+    # Per-item breakdown for debugging totals - one walk, one write
+    if _DEBUG_ORDER:
+        lines = ["", "💰 Calculating order total:", f"   Order ID: {qu_order_id}", f"   Items: {len(current_order)}"]
+        for idx, item in enumerate(current_order, 1):
+            # Get item name (check both 'name' and 'itemName' fields)
+            item_name = item.get('name') or item.get('itemName', 'Item')
+            lines.append(f"   {idx}. {item_name}: ${item.get('price', 8.99):.2f}")
+            # Modifiers should already be included in item price
+            for mod in item.get('modifiers') or ():
+                lines.append(f"      + {mod.get('name', 'Modifier')}: ${mod.get('price', 0):.2f} (already included in item price)")
+        lines.append(f"   TOTAL: ${total:.2f}\n\n")
+        sys.stdout.write("\n".join(lines))
     
     # Try to submit to Qu API (if available)
     try:
@@ -751,7 +855,7 @@ def submit_order_to_qu() -> str:
                 qu_order["items"].append(qu_item)
             
             # Attempt submission
-            response = requests.post(
+            response = _SESSION.post(
                 "https://gateway-api.qubeyond.com/api/v4/orders",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -766,7 +870,7 @@ def submit_order_to_qu() -> str:
                 qu_order_id = order_data.get("orderId") or order_data.get("id") or qu_order_id
                 print(f"✅ Order submitted to Qu API: {qu_order_id}")
                 
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "order_id": qu_order_id,
                     "total": round(total, 2),
@@ -779,7 +883,7 @@ def submit_order_to_qu() -> str:
         print(f"📝 Order saved locally with ID: {qu_order_id}")
     
     # Return success with simulated submission
-    return json.dumps({
+    return _dumps({
         "success": True,
         "order_id": qu_order_id,
         "total": round(total, 2),
@@ -795,14 +899,14 @@ def submit_order_to_qu() -> str:
 def order() -> str:
     """Get all details about the current order"""
     if not current_order:
-        return json.dumps({
+        return _dumps({
             "order_id": None,
             "items": [],
             "total": 0.0,
             "message": "Order is empty"
         })
     
-    total = sum(item.get("price", 0) for item in current_order)
+    total = _order_total
     
     result = {
         "order_id": qu_order_id or "ORD-12345",
@@ -812,57 +916,116 @@ def order() -> str:
         "submitted_to_qu": qu_order_id is not None
     }
     
-    return json.dumps(result, indent=2)
+    return _dumps(result)
+
+
+_MISS = object()  # sentinel so a present-but-None/"" value still wins in _pick
+
+
+def _pick(d: dict, *keys, default=""):
+    """Return the value of the first key present in d (the backend mixes snake_case and camelCase)"""
+    for key in keys:
+        value = d.get(key, _MISS)
+        if value is not _MISS:
+            return value
+    return default
+
+
+def _description(item: dict) -> str:
+    """An item's description, falling back to displayAttribute.description"""
+    description = item.get("description", _MISS)
+    if description is _MISS:
+        return (item.get("displayAttribute") or _NO_ATTRIBUTES).get("description", "")
+    return description
+
+
+# Short-lived cache of formatted backend query responses - customers re-ask for the same things.
+# Only real backend answers are cached (never the mock-data fallback); QUERY_CACHE_TTL=0 disables it
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_SIZE = 256
+_query_cache = OrderedDict()  # key -> (expires_at, response json) in LRU order
+_query_cache_lock = threading.Lock()
+
+
+def _cached_query(key):
+    """Return the cached response for key, or None if missing/expired"""
+    with _query_cache_lock:
+        entry = _query_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _query_cache[key]
+            return None
+        _query_cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_query(key, response: str) -> str:
+    """Store a formatted backend response under key (evicting the least recently used) and return it"""
+    if QUERY_CACHE_TTL > 0:
+        with _query_cache_lock:
+            _query_cache[key] = (time.monotonic() + QUERY_CACHE_TTL, response)
+            _query_cache.move_to_end(key)
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    return response
 
 
 def query_items(query: str, limit: int = 5) -> str:
     """Query available menu items from Rust backend server"""
     log_event("FUNCTION_CALL", f"query_items", {"query": query, "limit": limit})
+    cache_key = ("items", query.lower(), limit)
+    cached = _cached_query(cache_key)
+    if cached is not None:
+        return cached
+    
     start_timer("qu_query_items")
     try:
-        response = requests.post(
+        response = _SESSION.post(
             f"{BACKEND_URL}/query/items",
             json={"query": query, "limit": limit},
             timeout=5
         )
         response.raise_for_status()
-        data = response.json()
+        data = _json_body(response)
         end_timer("qu_query_items", {"query": query, "result_count": len(data.get("items", []))})
         
         # Format the response
         items = data.get("items", [])
         if not items:
-            return json.dumps({
+            return _cache_query(cache_key, _dumps({
                 "results": [],
                 "message": f"No items found matching '{query}'"
-            })
+            }))
         
         # Transform to expected format
-        results = []
-        for item in items:
-            results.append({
-                "itemPathKey": item.get("item_path_key", item.get("itemPathKey", "")),
-                "name": item.get("title", item.get("name", "")),  # Rust backend uses "title"
+        results = [
+            {
+                "itemPathKey": _pick(item, "item_path_key", "itemPathKey"),
+                "name": _pick(item, "title", "name"),  # Rust backend uses "title"
                 "category": item.get("category", ""),
                 "price": item.get("price", 0.0),
-                "description": item.get("description", item.get("displayAttribute", {}).get("description", ""))
-            })
+                "description": _description(item)
+            }
+            for item in items
+        ]
         
-        return json.dumps({
+        return _cache_query(cache_key, _dumps({
             "results": results,
             "count": len(results)
-        }, indent=2)
+        }))
         
     except requests.exceptions.RequestException as e:
         # Fallback to mock data if server is unavailable
         print(f"Warning: Could not reach backend server: {e}")
         print("Falling back to mock menu data...")
         
-        query_lower = query.lower()
+        query_words = query.lower().split()
         matches = []
-        for item in MENU_ITEMS.values():
-            name_lower = item["name"].lower()
-            if any(word in name_lower for word in query_lower.split()):
+        for name_lower, item in _MENU_ITEMS_LOWER:
+            if any(word in name_lower for word in query_words):
+                if len(matches) >= limit:
+                    break
                 matches.append({
                     "itemPathKey": item["itemPathKey"],
                     "name": item["name"],
@@ -871,66 +1034,79 @@ def query_items(query: str, limit: int = 5) -> str:
                     "description": item.get("description", "")
                 })
         
-        matches = matches[:limit]
-        return json.dumps({
+        return _dumps({
             "results": matches,
             "count": len(matches),
             "warning": "Using mock data - backend server unavailable"
-        }, indent=2)
+        })
 
 
 def query_modifiers(query: str, parent: str, limit: int = 5) -> str:
     """Query available modifiers for an item from Rust backend server"""
     log_event("FUNCTION_CALL", f"query_modifiers", {"query": query, "parent": parent, "limit": limit})
     global cached_modifiers
+    cache_key = ("modifiers", query.lower(), parent, limit)
+    cached = _cached_query(cache_key)
+    if cached is not None:
+        return cached  # its modifiers were added to cached_modifiers when it was first fetched
+    
     start_timer("qu_query_modifiers")
     try:
-        response = requests.post(
+        response = _SESSION.post(
             f"{BACKEND_URL}/query/modifiers",
             json={"query": query, "parent": parent, "limit": limit},
             timeout=5
         )
         response.raise_for_status()
-        data = response.json()
+        data = _json_body(response)
         end_timer("qu_query_modifiers", {"query": query, "parent": parent[:20], "result_count": len(data.get("results", []))})
         
         # Format the response
         items = data.get("items", [])
-        results = []
-        for item in items:
-            item_path_key = item.get("item_path_key", item.get("itemPathKey", ""))
-            item_name = item.get("title", item.get("name", ""))
-            item_price = item.get("price", 0.0)
-            
-            # Cache this modifier for later use in add_modifier
-            cached_modifiers[item_path_key] = {
-                "name": item_name,
-                "price": item_price
-            }
-            
-            results.append({
+        # One pass to pull (itemPathKey, name, price, modifierType) - both outputs below are built from it
+        fields = [
+            (
+                _pick(item, "item_path_key", "itemPathKey"),
+                _pick(item, "title", "name"),
+                item.get("price", 0.0),
+                _pick(item, "modifier_type", "modifierType")
+            )
+            for item in items
+        ]
+        
+        # Cache these modifiers for later use in add_modifier (add_modifier usually comes next)
+        cached_modifiers.update({
+            item_path_key: {"name": item_name, "price": item_price}
+            for item_path_key, item_name, item_price, _ in fields
+        })
+        
+        results = [
+            {
                 "itemPathKey": item_path_key,
                 "name": item_name,
-                "modifierType": item.get("modifier_type", item.get("modifierType", "")),
+                "modifierType": modifier_type,
                 "price": item_price
-            })
+            }
+            for item_path_key, item_name, item_price, modifier_type in fields
+        ]
         
-        return json.dumps({
+        return _cache_query(cache_key, _dumps({
             "parent": parent,
             "results": results,
             "count": len(results)
-        }, indent=2)
+        }))
         
     except requests.exceptions.RequestException as e:
         # Fallback to mock data if server is unavailable
         print(f"Warning: Could not reach backend server: {e}")
         print("Falling back to mock modifier data...")
         
-        query_lower = query.lower()
+        query_words = query.lower().split()
         matches = []
-        for mod in MODIFIERS.values():
-            name_lower = mod["name"].lower()
-            if any(word in name_lower for word in query_lower.split()):
+        for name_lower, mod in _MODIFIERS_LOWER:
+            if any(word in name_lower for word in query_words):
+                if len(matches) >= limit:
+                    break
                 matches.append({
                     "itemPathKey": mod["itemPathKey"],
                     "name": mod["name"],
@@ -938,13 +1114,42 @@ def query_modifiers(query: str, parent: str, limit: int = 5) -> str:
                     "price": mod["price"]
                 })
         
-        matches = matches[:limit]
-        return json.dumps({
+        return _dumps({
             "parent": parent,
             "results": matches,
             "count": len(matches),
             "warning": "Using mock data - backend server unavailable"
-        }, indent=2)
+        })
+
+
+# The only places current_order, current_order_index, _combo_slots and _order_total change together
+def _append_item(item: Dict[str, Any]) -> str:
+    """Add a new order entry (with itemId/price set) and return the add_item response"""
+    global _order_total
+    item_id = item["itemId"]
+    current_order.append(item)
+    current_order_index[item_id] = item
+    _order_total += item["price"]
+    
+    return _dumps({
+        "success": True,
+        "itemId": item_id,
+        "itemPathKey": item["itemPathKey"],
+        "itemName": item["name"],
+        "price": item["price"],
+        "message": f"Added {item['name']} to order"
+    })
+
+
+def _remove_item(item_id: str):
+    """Remove an order entry by itemId; returns the removed entry, or None if it isn't in the order"""
+    global _order_total
+    item = current_order_index.pop(item_id, None)
+    if item:
+        current_order.remove(item)
+        _combo_slots.pop(item_id, None)
+        _order_total -= item.get("price", 0)
+    return item
 
 
 def add_item(itemPathKey: str) -> str:
@@ -952,97 +1157,75 @@ def add_item(itemPathKey: str) -> str:
     log_event("FUNCTION_CALL", f"add_item", {"itemPathKey": itemPathKey})
     # Try to find in mock menu first
     if itemPathKey in MENU_ITEMS:
-        item = MENU_ITEMS[itemPathKey].copy()
-        item_id = str(uuid.uuid4())
-        item["itemId"] = item_id
-        item["modifiers"] = []
-        
-        current_order.append(item)
-        
-        return json.dumps({
-            "success": True,
-            "itemId": item_id,
-            "itemPathKey": itemPathKey,
-            "itemName": item["name"],
-            "price": item["price"],
-            "message": f"Added {item['name']} to order"
-        }, indent=2)
-    
-    # Try to find in cached menu from Qu API
-    item_name = None
-    
-    for category, items in cached_menu.items():
-        for cached_item in items:
-            if cached_item.get("itemPathKey") == itemPathKey:
-                item_name = cached_item.get("name", f"Item {itemPathKey}")
-                break
-        if item_name:
-            break
+        src = MENU_ITEMS[itemPathKey]
+        return _append_item({
+            "itemPathKey": src["itemPathKey"],
+            "name": src["name"],
+            "category": src["category"],
+            "price": src["price"],
+            "itemId": uuid.uuid4().hex,
+            "modifiers": []
+        })
     
-    # If not found in cache, use generic name
-    if not item_name:
-        item_name = f"Item {itemPathKey}"
+    # Try to find in cached menu from Qu API - if not found in cache, use generic name
+    cached_item = cached_menu_by_path.get(itemPathKey)
+    item_name = cached_item["name"] if cached_item else f"Item {itemPathKey}"
     
     # Get REAL Qu price for this item
     item_price = get_price_by_item_path_key(itemPathKey, item_name)
     
     # Create item entry
-    item_id = str(uuid.uuid4())
-    new_item = {
+    return _append_item({
         "itemPathKey": itemPathKey,
-        "itemId": item_id,
+        "itemId": uuid.uuid4().hex,
         "name": item_name,
         "price": item_price,
         "modifiers": []
-    }
-    
-    current_order.append(new_item)
-    
-    return json.dumps({
-        "success": True,
-        "itemId": item_id,
-        "itemPathKey": itemPathKey,
-        "itemName": item_name,
-        "price": item_price,
-        "message": f"Added {item_name} to order"
-    }, indent=2)
+    })
 
 
 def delete_item(itemId: str) -> str:
     """Remove an item from the order"""
     log_event("FUNCTION_CALL", f"delete_item", {"itemId": itemId})
-    global current_order
     
     # Find and remove item
-    original_count = len(current_order)
-    current_order = [item for item in current_order if item.get("itemId") != itemId]
-    
-    if len(current_order) < original_count:
-        return json.dumps({
+    if _remove_item(itemId):
+        return _dumps({
             "success": True,
             "itemId": itemId,
             "message": f"Item removed from order"
         })
     else:
-        return json.dumps({
+        return _dumps({
             "success": False,
             "itemId": itemId,
             "error": f"Item with ID '{itemId}' not found in order"
         })
 
 
+# Combo slots a modifier can fill - a new side/drink replaces the one already on the combo
+_SIDE_TOKENS = ("fries", "side")
+_DRINK_TOKENS = ("drink", "beverage", "coke", "sprite", "juice")
+
+
+def _combo_category(name_lower: str):
+    """Classify a lowercased modifier name as "side", "drink" or None"""
+    if any(token in name_lower for token in _SIDE_TOKENS):
+        return "side"
+    if any(token in name_lower for token in _DRINK_TOKENS):
+        return "drink"
+    return None
+
+
 def add_modifier(itemPathKey: str, itemId: str) -> str:
     """Add a modifier to an item in the order"""
     log_event("FUNCTION_CALL", f"add_modifier", {"itemPathKey": itemPathKey, "itemId": itemId})
+    global _order_total
     # Find the item in order
-    target_item = None
-    for item in current_order:
-        if item.get("itemId") == itemId:
-            target_item = item
-            break
+    target_item = current_order_index.get(itemId)
     
     if not target_item:
-        return json.dumps({
+        return _dumps({
             "success": False,
             "error": f"Item with ID '{itemId}' not found in order"
         })
@@ -1050,10 +1233,16 @@ def add_modifier(itemPathKey: str, itemId: str) -> str:
     # Try to find modifier in multiple sources:
     # 1. Mock data (MODIFIERS)
     # 2. Cached modifiers from recent query_modifiers calls
-    # 3. Direct Qu price lookup
+    # 3. Direct Qu price lookup with a generic name
     
     if itemPathKey in MODIFIERS:
-        modifier = MODIFIERS[itemPathKey].copy()
+        src = MODIFIERS[itemPathKey]
+        modifier = {
+            "itemPathKey": src["itemPathKey"],
+            "name": src["name"],
+            "modifierType": src["modifierType"],
+            "price": src["price"]
+        }
     elif itemPathKey in cached_modifiers:
         # Use cached modifier from query_modifiers
         cached_mod = cached_modifiers[itemPathKey]
@@ -1066,11 +1255,13 @@ def add_modifier(itemPathKey: str, itemId: str) -> str:
         if is_combo_modifier:
             # Combo modifiers are included at no extra charge
             modifier_price = 0.0
-            print(f"   ℹ️  '{modifier_name}' is included in combo (no extra charge)")
+            if _DEBUG_ORDER:
+                print(f"   ℹ️  '{modifier_name}' is included in combo (no extra charge)")
         else:
             # Standalone modifiers have their own price
             modifier_price = get_price_by_item_path_key(itemPathKey, modifier_name)
-            print(f"   💰 '{modifier_name}' is an extra charge: ${modifier_price:.2f}")
+            if _DEBUG_ORDER:
+                print(f"   💰 '{modifier_name}' is an extra charge: ${modifier_price:.2f}")
         
         modifier = {
             "itemPathKey": itemPathKey,
@@ -1078,34 +1269,21 @@ def add_modifier(itemPathKey: str, itemId: str) -> str:
             "price": modifier_price
         }
     else:
-        # Direct Qu price lookup - try to find modifier name
+        # Direct Qu price lookup - the name is unknown (the modifier wasn't in a query_modifiers
+        # result); use a generic name rather than block on a backend call
         parent_item_path_key = target_item.get("itemPathKey", "")
         is_combo_modifier = itemPathKey.startswith(parent_item_path_key + "-")
         
-        # Try to get a better name by looking it up in the backend
         modifier_name = "Modifier"
-        try:
-            # Query the Rust backend for this specific modifier
-            response = requests.post(
-                f"{BACKEND_URL}/query/modifiers",
-                json={"parent": parent_item_path_key, "query": "", "limit": 100},
-                timeout=3
-            )
-            if response.status_code == 200:
-                data = response.json()
-                for mod in data.get("results", []):
-                    if mod.get("itemPathKey") == itemPathKey:
-                        modifier_name = mod.get("name", "Modifier")
-                        break
-        except:
-            pass  # Fallback to generic name
         
         if is_combo_modifier:
             modifier_price = 0.0
-            print(f"   ℹ️  '{modifier_name}' is included in combo (no extra charge)")
+            if _DEBUG_ORDER:
+                print(f"   ℹ️  '{modifier_name}' is included in combo (no extra charge)")
         else:
             modifier_price = get_price_by_item_path_key(itemPathKey, modifier_name)
-            print(f"   💰 '{modifier_name}' is an extra charge: ${modifier_price:.2f}")
+            if _DEBUG_ORDER:
+                print(f"   💰 '{modifier_name}' is an extra charge: ${modifier_price:.2f}")
         
         modifier = {
             "itemPathKey": itemPathKey,
@@ -1116,43 +1294,32 @@ def add_modifier(itemPathKey: str, itemId: str) -> str:
     # Check if we're replacing an existing modifier of the same type (e.g., fries with fries)
     # If the modifier is a side/drink for a combo, replace any existing side/drink of same category
     parent_item_path_key = target_item.get("itemPathKey", "")
-    if itemPathKey.startswith(parent_item_path_key + "-"):
-        # This is a combo modifier - check if we're replacing one
-        modifier_category = None
-        if "fries" in modifier["name"].lower() or "side" in modifier["name"].lower():
-            modifier_category = "side"
-        elif "drink" in modifier["name"].lower() or "beverage" in modifier["name"].lower():
-            modifier_category = "drink"
-        
-        if modifier_category:
-            # Remove any existing modifier of the same category
-            existing_modifiers = target_item["modifiers"]
-            for i, existing_mod in enumerate(existing_modifiers):
-                existing_name = existing_mod.get("name", "").lower()
-                if modifier_category == "side" and ("fries" in existing_name or "side" in existing_name):
-                    # Replace the side
-                    target_item["price"] -= existing_mod["price"]
-                    target_item["modifiers"].pop(i)
-                    print(f"   🔄 Replacing {existing_mod['name']} with {modifier['name']}")
-                    break
-                elif modifier_category == "drink" and ("drink" in existing_name or "beverage" in existing_name or "coke" in existing_name or "sprite" in existing_name or "juice" in existing_name):
-                    # Replace the drink
-                    target_item["price"] -= existing_mod["price"]
-                    target_item["modifiers"].pop(i)
-                    print(f"   🔄 Replacing {existing_mod['name']} with {modifier['name']}")
-                    break
-    
+    modifier_category = _combo_category(modifier["name"].lower())
+    slots = _combo_slots.setdefault(itemId, {})
+    if modifier_category and itemPathKey.startswith(parent_item_path_key + "-"):
+        # This is a combo modifier - replace the side or drink already on the item, if any
+        existing_mod = slots.get(modifier_category)
+        if existing_mod is not None:
+            target_item["price"] -= existing_mod["price"]
+            _order_total -= existing_mod["price"]
+            target_item["modifiers"].remove(existing_mod)
+            if _DEBUG_ORDER:
+                print(f"   🔄 Replacing {existing_mod['name']} with {modifier['name']}")
+    
+    if modifier_category:
+        slots[modifier_category] = modifier
     target_item["modifiers"].append(modifier)
     target_item["price"] += modifier["price"]
+    _order_total += modifier["price"]
     
-    return json.dumps({
+    return _dumps({
         "success": True,
         "itemId": itemId,
         "itemPathKey": itemPathKey,
         "modifier_name": modifier["name"],
         "modifier_price": modifier["price"],
-        "message": f"Added {modifier['name']} to {target_item.get('itemName', target_item.get('name', 'item'))}"
-    }, indent=2)
+        "message": f"Added {modifier['name']} to {_pick(target_item, 'itemName', 'name', default='item')}"
+    })
 
 
 # Function mapping for easy lookup
@@ -1170,7 +1337,8 @@ FUNCTION_MAP = {
 
 
 if __name__ == "__main__":
-    # Test the functions
+    # Test the functions (indented output for reading)
+    PRETTY_JSON = True
     print("=== Testing query_items ===")
     print(query_items("burger", limit=3))
     
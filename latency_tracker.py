@@ -6,25 +6,79 @@ Tracks performance across Qu API, Deepgram, and UI layers
 import time
 import json
 import os
+import atexit
+import queue
+import threading
 from typing import Dict, List, Optional
-from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
 
 # Log file location
 LOG_FILE = os.path.join(os.path.dirname(__file__), "latency_logs.txt")
 
+_STOP = object()  # queue sentinel - tells the log writer thread to flush and exit
+
+# Percentiles are computed over the most recent samples per operation (bounded memory)
+SAMPLE_WINDOW = int(os.getenv("LATENCY_SAMPLE_WINDOW", "1024"))
+
+_last_second = (None, "")  # (int epoch second, formatted "%Y-%m-%d %H:%M:%S") - reused for the whole second
+
+
+def _timestamp() -> str:
+    """Local time as "YYYY-mm-dd HH:MM:SS.mmm" - the seconds part is only re-formatted once per second"""
+    global _last_second
+    now = time.time()
+    second = int(now)
+    cached_second, prefix = _last_second
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        _last_second = (second, prefix)
+    return f"{prefix}.{int((now - second) * 1000):03d}"
+
+
+class _OperationStats:
+    """
+    Running count/sum/min/max for one operation, plus a bounded window of recent samples for percentiles.
+    Latencies are integer nanoseconds; get_stats converts to ms
+    """
+    __slots__ = ("count", "total", "min", "max", "window")
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.window = deque(maxlen=SAMPLE_WINDOW)
+    
+    def add(self, latency: int):
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if latency > self.max:
+            self.max = latency
+        self.window.append(latency)
+
+
 class LatencyTracker:
     """
     Centralized latency tracking for all system components
     """
     
     def __init__(self):
-        self.metrics: Dict[str, List[float]] = defaultdict(list)
-        self.current_timers: Dict[str, float] = {}
+        self.metrics: Dict[str, _OperationStats] = defaultdict(_OperationStats)
+        self.current_timers: Dict[str, int] = {}  # operation -> perf_counter_ns() at start
+        
+        # Log lines are queued and written in batches by a background thread,
+        # so timers never wait on file I/O
+        self._log_queue = queue.SimpleQueue()
+        self._log_fp = None  # opened by the writer thread on its first batch
+        self._log_thread = threading.Thread(target=self._drain_log, name="latency-log-writer", daemon=True)
+        self._log_thread.start()
+        atexit.register(self.close)
         
-    def start_timer(self, operation: str) -> float:
-        """Start timing an operation"""
-        start_time = time.time()
+    def start_timer(self, operation: str) -> int:
+        """Start timing an operation (monotonic, in perf_counter_ns units)"""
+        start_time = time.perf_counter_ns()
         self.current_timers[operation] = start_time
         return start_time
     
@@ -35,10 +89,11 @@ class LatencyTracker:
             return 0.0
         
         start_time = self.current_timers.pop(operation)
-        latency = (time.time() - start_time) * 1000  # Convert to ms
+        elapsed_ns = time.perf_counter_ns() - start_time
         
-        # Record the metric
-        self.metrics[operation].append(latency)
+        # Record the metric (kept in ns - converted to ms only for output)
+        self.metrics[operation].add(elapsed_ns)
+        latency = elapsed_ns / 1_000_000
         
         # Write to log file
         self._write_log("LATENCY", operation, latency, metadata)
@@ -47,27 +102,59 @@ class LatencyTracker:
     
     def _write_log(self, log_type: str, operation: str, latency: float = None, metadata: Optional[Dict] = None):
         """Write a log entry to the log file"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # Include milliseconds
+        timestamp = _timestamp()  # Include milliseconds
         
+        parts = [timestamp, log_type, operation]
         if latency is not None:
-            log_line = f"{timestamp} | {log_type} | {operation} | {latency:.2f}ms"
+            parts.append(f"{latency:.2f}ms")
             if metadata:
                 # Format metadata as key=value pairs
-                meta_str = " | ".join([f"{k}={v}" for k, v in metadata.items()])
-                log_line += f" | {meta_str}"
-        else:
-            log_line = f"{timestamp} | {log_type} | {operation}"
+                parts.extend([f"{k}={v}" for k, v in metadata.items()])
         
-        # Append to log file
-        try:
-            with open(LOG_FILE, 'a') as f:
-                f.write(log_line + "\n")
-        except Exception as e:
-            print(f"Failed to write to log file: {e}")
+        # Hand off to the writer thread (it adds the newlines when it joins the batch)
+        self._log_queue.put(" | ".join(parts))
+    
+    def _drain_log(self):
+        """Writer thread: write queued log lines in batches (one joined write + flush per batch)"""
+        get = self._log_queue.get
+        get_nowait = self._log_queue.get_nowait
+        while True:
+            batch = [get()]
+            try:
+                while True:
+                    batch.append(get_nowait())
+            except queue.Empty:
+                pass
+            
+            stop = _STOP in batch
+            lines = [line for line in batch if line is not _STOP]
+            if lines:
+                try:
+                    if self._log_fp is None:
+                        self._log_fp = open(LOG_FILE, 'a', buffering=64 * 1024)
+                    self._log_fp.write("\n".join(lines) + "\n")
+                    self._log_fp.flush()
+                except Exception as e:
+                    print(f"Failed to write to log file: {e}")
+            if stop:
+                return
+    
+    def close(self):
+        """Flush pending log lines and close the log file (registered with atexit)"""
+        if self._log_thread.is_alive():
+            self._log_queue.put(_STOP)
+            self._log_thread.join(timeout=2)
+        if self._log_fp is not None:
+            try:
+                self._log_fp.close()
+            except Exception:
+                pass
+            self._log_fp = None
     
     def get_stats(self, operation: str) -> Dict:
         """Get statistics for an operation"""
-        if operation not in self.metrics or not self.metrics[operation]:
+        stats = self.metrics.get(operation)
+        if stats is None or not stats.count:
             return {
                 "operation": operation,
                 "count": 0,
@@ -78,17 +165,18 @@ class LatencyTracker:
                 "p99_ms": 0
             }
         
-        latencies = sorted(self.metrics[operation])
-        count = len(latencies)
+        # count/avg/min/max cover every sample; p95/p99 cover the last SAMPLE_WINDOW
+        recent = sorted(stats.window)
+        window_count = len(recent)
         
         return {
             "operation": operation,
-            "count": count,
-            "avg_ms": round(sum(latencies) / count, 2),
-            "min_ms": round(min(latencies), 2),
-            "max_ms": round(max(latencies), 2),
-            "p95_ms": round(latencies[int(count * 0.95)] if count > 0 else 0, 2),
-            "p99_ms": round(latencies[int(count * 0.99)] if count > 0 else 0, 2)
+            "count": stats.count,
+            "avg_ms": round(stats.total / stats.count / 1_000_000, 2),
+            "min_ms": round(stats.min / 1_000_000, 2),
+            "max_ms": round(stats.max / 1_000_000, 2),
+            "p95_ms": round(recent[int(window_count * 0.95)] / 1_000_000, 2),
+            "p99_ms": round(recent[int(window_count * 0.99)] / 1_000_000, 2)
         }
     
     def get_all_stats(self) -> List[Dict]:
@@ -125,7 +213,7 @@ def get_tracker() -> LatencyTracker:
 
 
 # Convenience functions
-def start_timer(operation: str) -> float:
+def start_timer(operation: str) -> int:
     """Start timing an operation"""
     return _tracker.start_timer(operation)
 
@@ -58,6 +58,7 @@ echo ""
 
 # Step 5: Restart Python service
 echo "🐍 Step 5: Restarting Python service..."
+rm -f ~/dg-compat-lab/menu_cache.pkl  # drop the pre-refresh menu snapshot (MENU_CACHE_TTL)
 sudo systemctl restart jitb-web
 sleep 3
 echo "✅ Python service restarted"
@@ -5,20 +5,32 @@ Run with: uvicorn web_voice_agent_server:app --host 0.0.0.0 --port 8000
 
 import os
 import asyncio
+import functools
+import gzip
+import hashlib
 import json
+import ssl
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request, WebSocketDisconnect
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
+from starlette.routing import WebSocketRoute
 import websockets
 
+try:
+    import orjson
+except ImportError:  # optional - falls back to stdlib json
+    orjson = None
+
 # Import Jack in the Box function handlers
 import jitb_functions
 from jitb_functions import FUNCTION_MAP, load_menu_categories
 
 # Import shared agent configuration
-from agent_config import get_agent_settings, MIC_SR, SPK_SR
+from agent_config import get_agent_settings_json, eager_init, reload_prompt, MIC_SR, SPK_SR
 
 # Import latency tracking
 from latency_tracker import start_timer, end_timer
@@ -28,106 +40,375 @@ load_dotenv()
 DG_KEY = os.getenv("DEEPGRAM_API_KEY")
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 DG_URL = "wss://agent.deepgram.com/v1/agent/converse"
+DG_HEADERS = [
+    ("Authorization", f"Token {DG_KEY}"),
+    ("X-OpenAI-API-Key", OPENAI_KEY)
+]  # built once - the keys don't change while the server runs
+# One TLS context for every Deepgram connection. Left to itself, each wss:// connect builds a fresh
+# default context and re-loads the system CA bundle before the handshake even starts
+DG_SSL = ssl.create_default_context()
+
+# Deepgram events that arrive back-to-back are sent to the browser as one {"type": "batch"} frame -
+# only for pages that opt in with /ws?batch=1 (older copies of the UI on /dev and /test don't unwrap it)
+BROWSER_BATCH_MAX = 32
+BROWSER_QUEUE_SIZE = 256  # bounded so a slow browser still applies backpressure to the relay
+_CLOSE = object()  # outbox sentinel - stops the browser sender
+# Agent audio goes to the browser in whole 20ms frames (16-bit mono), so a chunk never ends
+# mid-sample - the UI's Int16Array() rejects odd byte lengths and drops the whole chunk
+AUDIO_FRAME_BYTES = int(SPK_SR * 0.020) * 2
+_PONG = '{"type":"pong"}'
+_CONNECTED = '{"type":"connected","message":"Connected to voice agent"}'
+_READY = '{"type":"ready","message":"Agent ready"}'
+_KEEPALIVE = '{"type":"KeepAlive"}'
+
+# Warm pool of pre-connected Deepgram sockets (0 = connect per browser, the default).
+# Pooled sockets get a KeepAlive every DG_KEEPALIVE_INTERVAL seconds and are recycled after
+# DG_POOL_MAX_IDLE seconds unused
+DG_POOL_SIZE = int(os.getenv("DG_POOL_SIZE", "0"))
+DG_POOL_MAX_IDLE = float(os.getenv("DG_POOL_MAX_IDLE", "30"))
+DG_KEEPALIVE_INTERVAL = 5
+
+# Function calls (blocking HTTP to the Rust backend) run on one bounded pool shared by all
+# connections; each connection runs its calls one at a time, so this caps concurrent calls
+FUNCTION_WORKERS = int(os.getenv("FUNCTION_WORKERS", "8"))
+function_executor = ThreadPoolExecutor(max_workers=FUNCTION_WORKERS, thread_name_prefix="jitb-fn")
 
 app = FastAPI(title="Jack in the Box Voice Agent")
 
+
+def _loads(data):
+    """Parse a relay message (str or bytes) - orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj) -> str:
+    """Compact JSON text for a relay message - orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+class DeepgramSettingsError(Exception):
+    """Deepgram rejected the agent settings"""
+
+
+async def connect_deepgram():
+    """Connect to the Deepgram agent and wait for Welcome; returns the socket, not yet configured"""
+    # No permessage-deflate: nearly every frame is PCM audio, which doesn't compress and would
+    # cost a zlib pass per 20ms frame in each direction
+    # Keepalive pings (websockets' default, every 20s) also keep pooled sockets' NAT state warm
+    dg_ws = await websockets.connect(
+        DG_URL,
+        extra_headers=DG_HEADERS,
+        compression=None,
+        ssl=DG_SSL if DG_URL.startswith("wss://") else None
+    )
+    try:
+        print("✅ Connected to Deepgram")
+        
+        # Wait for welcome message
+        welcome_msg = await dg_ws.recv()
+        welcome_data = _loads(welcome_msg)
+        print(f"📩 Deepgram: {welcome_data.get('type')}")
+        return dg_ws
+    except BaseException:
+        await dg_ws.close()
+        raise
+
+
+async def configure_deepgram(dg_ws):
+    """Apply the agent settings to a connected socket and wait for the confirmation; returns the ready socket"""
+    try:
+        # Configure the agent using shared configuration (pre-serialized by eager_init; looked up per
+        # connection rather than stored here so /reload-prompt takes effect for the next caller)
+        settings_json = get_agent_settings_json(mic_sample_rate=MIC_SR, speaker_sample_rate=SPK_SR)
+        
+        await dg_ws.send(settings_json)
+        print("⚙️  Settings sent to Deepgram")
+        
+        # Wait for settings confirmation
+        settings_msg = await dg_ws.recv()
+        settings_data = _loads(settings_msg)
+        msg_type = settings_data.get('type')
+        print(f"📩 Settings response: {msg_type}")
+        
+        if msg_type == "Error":
+            print(f"❌ Settings Error: {json.dumps(settings_data, indent=2)}")
+            raise DeepgramSettingsError("Failed to configure agent")
+        return dg_ws
+    except BaseException:
+        await dg_ws.close()
+        raise
+
+
+async def open_deepgram():
+    """Connect to the Deepgram agent and apply the agent settings; returns the ready socket"""
+    return await configure_deepgram(await connect_deepgram())
+
+
+class DeepgramPool:
+    """
+    Keeps a few Deepgram sockets connected ahead of time, so a new browser skips the TCP/TLS handshake
+    and Welcome round-trip. Settings are only sent once a browser attaches - a configured session would
+    start the greeting and buffer its audio on the idle socket. Each socket serves one browser and is
+    closed after it; the pool refills in the background
+    """
+    
+    def __init__(self, size: int, max_idle: float):
+        self.size = size
+        self.max_idle = max_idle
+        self._ready = deque()  # (dg_ws, pooled_at, keepalive_task)
+        self._pending = 0
+        self._tasks = set()
+    
+    def start(self):
+        self.refill()
+        self._spawn(self._maintain())
+    
+    def take(self):
+        """Return a live pooled socket (or None if none is ready) and start a replacement"""
+        self._prune()
+        dg_ws = None
+        if self._ready:
+            dg_ws, _, keepalive_task = self._ready.popleft()
+            keepalive_task.cancel()
+        self.refill()
+        return dg_ws
+    
+    def refill(self):
+        while len(self._ready) + self._pending < self.size:
+            self._pending += 1
+            self._spawn(self._fill_one())
+    
+    async def close(self):
+        self.size = 0
+        for task in list(self._tasks):
+            task.cancel()
+        while self._ready:
+            dg_ws, _, keepalive_task = self._ready.popleft()
+            keepalive_task.cancel()
+            await dg_ws.close()
+    
+    def _prune(self):
+        """Close pooled sockets that dropped or went stale"""
+        now = time.monotonic()
+        keep = deque()
+        for entry in self._ready:
+            dg_ws, pooled_at, keepalive_task = entry
+            if dg_ws.open and now - pooled_at < self.max_idle:
+                keep.append(entry)
+            else:
+                keepalive_task.cancel()
+                self._spawn(dg_ws.close())
+        self._ready = keep
+    
+    async def _fill_one(self):
+        try:
+            dg_ws = await connect_deepgram()
+        except Exception as e:
+            print(f"⚠️  Deepgram pool: could not pre-connect: {e}")
+            await asyncio.sleep(5)  # back off - the slot stays counted as pending meanwhile
+            return
+        finally:
+            self._pending -= 1
+        
+        keepalive_task = asyncio.create_task(self._keep_alive(dg_ws))
+        self._ready.append((dg_ws, time.monotonic(), keepalive_task))
+        print(f"🔌 Deepgram pool: {len(self._ready)}/{self.size} sockets ready")
+    
+    @staticmethod
+    async def _keep_alive(dg_ws):
+        """Send KeepAlive while the socket sits idle (no audio yet) so Deepgram doesn't time it out"""
+        try:
+            while True:
+                await asyncio.sleep(DG_KEEPALIVE_INTERVAL)
+                await dg_ws.send(_KEEPALIVE)
+        except websockets.exceptions.ConnectionClosed:
+            pass  # _prune drops it
+    
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.max_idle / 2)
+            self._prune()
+            self.refill()
+    
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+dg_pool = None  # DeepgramPool when DG_POOL_SIZE > 0
+
+
 # Load menu data at startup
 @app.on_event("startup")
 async def startup_event():
+    global dg_pool
     load_menu_categories()
     print("✅ Menu categories loaded")
+    
+    # Build agent settings now so the first customer connection doesn't pay for it
+    eager_init()
+    print("✅ Agent settings built")
+    
+    # Read and compress the pages and icons up front (dev/test pages may not exist on every host)
+    for path in STATIC_ASSETS:
+        try:
+            _static_asset(path)
+        except OSError:
+            pass
+    
+    if DG_POOL_SIZE > 0:
+        dg_pool = DeepgramPool(DG_POOL_SIZE, DG_POOL_MAX_IDLE)
+        dg_pool.start()
+        print(f"✅ Pre-connecting {DG_POOL_SIZE} Deepgram socket(s)")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if dg_pool is not None:
+        await dg_pool.close()
+    function_executor.shutdown(wait=False)
 
 # Serve the HTML page - Production
+# Page and icon bytes, kept in memory with a gzipped copy and an ETag. Re-read when the file
+# changes on disk (dev edits, /promote-to-test), so a stat is the only per-request file work
+_static_cache = {}  # path -> (mtime_ns, size, raw, gzipped, etag)
+
+def _static_asset(path):
+    st = os.stat(path)
+    entry = _static_cache.get(path)
+    if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+        with open(path, "rb") as f:
+            raw = f.read()
+        etag = 'W/"' + hashlib.sha1(raw).hexdigest() + '"'  # weak: same tag for gzip and identity
+        entry = (st.st_mtime_ns, st.st_size, raw, gzip.compress(raw, 6), etag)
+        _static_cache[path] = entry
+    return entry
+
+def _serve_static(request: Request, path: str, media_type: str):
+    _, _, raw, gzipped, etag = _static_asset(path)
+    # no-cache = always revalidate; unchanged pages come back as a bodiless 304
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", "") and len(gzipped) < len(raw):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gzipped, media_type=media_type, headers=headers)
+    return Response(content=raw, media_type=media_type, headers=headers)
+
+STATIC_ASSETS = (
+    "web_voice_agent_ui.html",
+    "web_voice_agent_ui_dev.html",
+    "web_voice_agent_ui_test.html",
+    "jack-in-the-box-1-icon.ico",
+    "jack-in-the-box-1-icon.svg",
+)
+
 @app.get("/")
-async def get():
-    with open("web_voice_agent_ui.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+async def get(request: Request):
+    return _serve_static(request, "web_voice_agent_ui.html", "text/html")
 
 # Serve favicon
 @app.get("/favicon.ico")
-async def favicon():
-    return FileResponse("jack-in-the-box-1-icon.ico", media_type="image/x-icon")
+async def favicon(request: Request):
+    return _serve_static(request, "jack-in-the-box-1-icon.ico", "image/x-icon")
 
 @app.get("/jack-in-the-box-1-icon.ico")
-async def favicon_ico():
-    return FileResponse("jack-in-the-box-1-icon.ico", media_type="image/x-icon")
+async def favicon_ico(request: Request):
+    return _serve_static(request, "jack-in-the-box-1-icon.ico", "image/x-icon")
 
 @app.get("/jack-in-the-box-1-icon.svg")
-async def favicon_svg():
-    return FileResponse("jack-in-the-box-1-icon.svg", media_type="image/svg+xml")
+async def favicon_svg(request: Request):
+    return _serve_static(request, "jack-in-the-box-1-icon.svg", "image/svg+xml")
 
 # Development environment - for testing new changes
 @app.get("/dev")
-async def get_dev():
-    with open("web_voice_agent_ui_dev.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+async def get_dev(request: Request):
+    return _serve_static(request, "web_voice_agent_ui_dev.html", "text/html")
 
 # Test environment - stable version for testers
 @app.get("/test")
-async def get_test():
-    with open("web_voice_agent_ui_test.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+async def get_test(request: Request):
+    return _serve_static(request, "web_voice_agent_ui_test.html", "text/html")
+
+_last_second = (None, "")  # (int epoch second, local ISO timestamp) - reused for the whole second
+
+def _now_iso():
+    """Local time as "YYYY-mm-ddTHH:MM:SS" - only re-formatted once per second"""
+    global _last_second
+    second = int(time.time())
+    cached_second, iso = _last_second
+    if second != cached_second:
+        iso = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second))
+        _last_second = (second, iso)
+    return iso
+
+# Prebuilt /menu body, split around the timestamp: (cached_menu, QU_PRICES, head, tail).
+# Rebuilt whenever jitb_functions swaps in a new cached_menu or QU_PRICES
+_menu_payload = None
+
+def _build_menu_payload(cached_menu, QU_PRICES):
+    """Serialize the priced menu once; returns the JSON bytes before and after the timestamp value"""
+    # Build menu with real prices
+    menu_with_prices = {}
+    
+    for category, items in cached_menu.items():
+        menu_with_prices[category] = []
+        
+        # Ensure items is a list
+        if not isinstance(items, list):
+            continue
+            
+        for item in items:
+            item_path_key = item.get("itemPathKey")
+            item_name = item.get("name", "Unknown")
+            
+            # Skip modifiers - they're not standalone menu items
+            if item_name.startswith("Mod -") or item_name.startswith("Modifier -"):
+                continue
+            
+            # Get real Qu price
+            price = QU_PRICES.get(item_path_key, 0.0)
+            
+            # Skip items with $0.00 price (system/internal items)
+            if price > 0:
+                menu_with_prices[category].append({
+                    "name": item_name,
+                    "price": float(price) if price else 0.0,
+                    "itemPathKey": item_path_key
+                })
+    
+    # Remove empty categories
+    menu_with_prices = {k: v for k, v in menu_with_prices.items() if v}
+    
+    # Add metadata - same shape as before, with the timestamp spliced in per request
+    location_id = os.getenv("LOCATION_ID", "4776")
+    counts = _dumps({
+        "total_items": sum(len(items) for items in menu_with_prices.values()),
+        "categories": list(menu_with_prices.keys())
+    })
+    head = '{"metadata":{"location_id":' + _dumps(location_id) + ',"timestamp":"'
+    tail = '",' + counts[1:-1] + '},"menu":' + _dumps(menu_with_prices) + '}'
+    return head.encode(), tail.encode()
 
 # Menu endpoint - returns menu with prices for UI display
 @app.get("/menu")
 async def get_menu():
     """Get full menu with prices from Qu API via Rust backend"""
-    import jitb_functions
-    import os
-    from datetime import datetime
-    
-    # Build menu with real prices
-    menu_with_prices = {}
+    global _menu_payload
     
     try:
         cached_menu = jitb_functions.cached_menu
         QU_PRICES = jitb_functions.QU_PRICES
         
-        for category, items in cached_menu.items():
-            menu_with_prices[category] = []
-            
-            # Ensure items is a list
-            if not isinstance(items, list):
-                continue
-                
-            for item in items:
-                item_path_key = item.get("itemPathKey")
-                item_name = item.get("name", "Unknown")
-                
-                # Skip modifiers - they're not standalone menu items
-                if item_name.startswith("Mod -") or item_name.startswith("Modifier -"):
-                    continue
-                
-                # Get real Qu price
-                price = QU_PRICES.get(item_path_key, 0.0)
-                
-                # Skip items with $0.00 price (system/internal items)
-                if price > 0:
-                    menu_with_prices[category].append({
-                        "name": item_name,
-                        "price": float(price) if price else 0.0,
-                        "itemPathKey": item_path_key
-                    })
-        
-        # Remove empty categories
-        menu_with_prices = {k: v for k, v in menu_with_prices.items() if v}
+        if _menu_payload is None or _menu_payload[0] is not cached_menu or _menu_payload[1] is not QU_PRICES:
+            _menu_payload = (cached_menu, QU_PRICES) + _build_menu_payload(cached_menu, QU_PRICES)
         
-        # Add metadata
-        location_id = os.getenv("LOCATION_ID", "4776")
-        timestamp = datetime.now().isoformat()
-        
-        return {
-            "metadata": {
-                "location_id": location_id,
-                "timestamp": timestamp,
-                "total_items": sum(len(items) for items in menu_with_prices.values()),
-                "categories": list(menu_with_prices.keys())
-            },
-            "menu": menu_with_prices
-        }
+        timestamp = _now_iso()
+        return Response(content=_menu_payload[2] + timestamp.encode() + _menu_payload[3], media_type="application/json")
     except Exception as e:
         print(f"Error in /menu endpoint: {e}")
         import traceback
@@ -144,7 +425,7 @@ async def promote_to_test():
         return {
             "success": True, 
             "message": "Successfully promoted dev to test!",
-            "timestamp": __import__('datetime').datetime.now().isoformat()
+            "timestamp": _now_iso()
         }
     except Exception as e:
         return {
@@ -152,206 +433,332 @@ async def promote_to_test():
             "error": str(e)
         }
 
-# WebSocket endpoint for browser clients
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    print("🌐 Browser client connected")
+# Hot-swap the agent prompt - re-reads prompts/, prompt_menu.json and function schemas
+@app.post("/reload-prompt")
+async def reload_agent_prompt(version: str = None):
+    """Reload the agent prompt from disk (optionally switching version) without a restart"""
+    try:
+        active_version = reload_prompt(version)
+        return {
+            "success": True,
+            "prompt_version": active_version,
+            "message": f"Reloaded prompt {active_version}"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+class RelayContext:
+    """Per-connection relay state, passed to the relay tasks and the Deepgram message handlers"""
+    __slots__ = ("receive", "send", "dg_ws", "batch", "outbox", "func_q", "last_audio_time", "audio_carry")
     
-    # Start conversation log
-    jitb_functions.start_conversation_log()
+    def __init__(self, receive, send, dg_ws, batch=False):
+        self.receive = receive  # browser socket's ASGI receive/send callables
+        self.send = send
+        self.dg_ws = dg_ws
+        self.batch = batch  # browser unwraps {"type": "batch"} frames
+        # Everything bound for the browser goes through one ordered outbox: audio stays
+        # in sequence with the events around it (e.g. barge-in), and events already
+        # waiting are coalesced into one frame instead of one frame each
+        self.outbox = asyncio.Queue(maxsize=BROWSER_QUEUE_SIZE)
+        # Function calls run on their own worker so the Deepgram read loop keeps forwarding
+        # audio and events while a backend call is in flight; one worker keeps calls in order
+        self.func_q = asyncio.Queue()
+        self.last_audio_time = None  # when the current user utterance started
+        self.audio_carry = bytearray()  # tail of the last agent audio chunk that didn't fill a frame
+
+# Handlers for the Deepgram message types the relay acts on - every message is still forwarded
+# to the browser afterwards. Looked up by type, so other messages skip straight to forwarding
+async def _on_user_started_speaking(data, ctx):
+    # Barge-in: the browser drops the interrupted reply, so drop its tail too
+    ctx.audio_carry.clear()
+    # User finished speaking, agent is processing
+    if ctx.last_audio_time:
+        end_timer("user_speech", {"duration_sec": round(time.time() - ctx.last_audio_time, 2)})
+        ctx.last_audio_time = None
+    start_timer("deepgram_response")
+
+async def _on_agent_thinking(data, ctx):
+    # Agent finished responding
+    end_timer("deepgram_response", {"type": "AgentThinking"})
+
+async def _on_agent_audio_done(data, ctx):
+    # Agent finished responding
+    end_timer("deepgram_response", {"type": "AgentAudioDone"})
     
-    # Connect to Deepgram
+    # Flush the last partial frame (whole samples only) ahead of AgentAudioDone
+    audio_carry = ctx.audio_carry
+    if audio_carry:
+        tail = len(audio_carry) & ~1
+        if tail:
+            await ctx.outbox.put(bytes(audio_carry[:tail]))
+        audio_carry.clear()
+
+async def _on_function_call_request(data, ctx):
+    # Hand function calls to the worker and keep reading
+    ctx.func_q.put_nowait(data)
+
+DG_HANDLERS = {
+    "UserStartedSpeaking": _on_user_started_speaking,
+    "AgentThinking": _on_agent_thinking,
+    "AgentAudioDone": _on_agent_audio_done,
+    "FunctionCallRequest": _on_function_call_request,
+}
+
+def _peek_type(msg):
+    """Read the "type" of a Deepgram message without parsing it, when it's the leading key (else None)"""
+    if msg.startswith('{"type":"'):
+        start = 9
+    elif msg.startswith('{"type": "'):
+        start = 10
+    else:
+        return None
+    end = msg.find('"', start)
+    return msg[start:end] if end > 0 else None
+
+# Task to receive from browser and forward to Deepgram
+async def _browser_to_deepgram(ctx):
+    # One receive loop for both frame kinds (ASGI allows only one receiver per socket);
+    # audio is checked first since nearly every frame is a 20ms audio chunk
+    receive = ctx.receive
+    send_audio = ctx.dg_ws.send
     try:
-        async with websockets.connect(
-            DG_URL,
-            extra_headers=[
-                ("Authorization", f"Token {DG_KEY}"),
-                ("X-OpenAI-API-Key", OPENAI_KEY)
-            ]
-        ) as dg_ws:
-            print("✅ Connected to Deepgram")
+        while True:
+            data = await receive()
             
-            # Wait for welcome message
-            welcome_msg = await dg_ws.recv()
-            welcome_data = json.loads(welcome_msg)
-            print(f"📩 Deepgram: {welcome_data.get('type')}")
-            
-            # Send welcome to browser
-            await websocket.send_json({"type": "connected", "message": "Connected to voice agent"})
-            
-            # Configure the agent using shared configuration
-            settings = get_agent_settings(mic_sample_rate=MIC_SR, speaker_sample_rate=SPK_SR)
+            audio = data.get("bytes")
+            if audio is not None:
+                # Audio data from browser - track when user starts speaking
+                if ctx.last_audio_time is None:
+                    start_timer("user_speech")
+                    ctx.last_audio_time = time.time()
+                await send_audio(audio)
+                continue
             
-            await dg_ws.send(json.dumps(settings))
-            print("⚙️  Settings sent to Deepgram")
+            text = data.get("text")
+            if text is not None:
+                # Control messages from browser
+                msg = _loads(text)
+                if msg.get("type") == "ping":
+                    await ctx.send({"type": "websocket.send", "text": _PONG})
+            elif data["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(data.get("code", 1000))
+    
+    except (WebSocketDisconnect, RuntimeError) as e:
+        print("🌐 Browser disconnected")
+    except websockets.exceptions.ConnectionClosed:
+        pass  # Deepgram side closed - deepgram_to_browser reports it
+    except Exception as e:
+        print(f"❌ Browser→Deepgram error: {e}")
+
+async def _browser_sender(ctx):
+    send = ctx.send
+    outbox = ctx.outbox
+    batch_max = BROWSER_BATCH_MAX if ctx.batch else 1
+    carry = None
+    try:
+        while True:
+            item = carry if carry is not None else await outbox.get()
+            carry = None
+            if item is _CLOSE:
+                break
             
-            # Wait for settings confirmation
-            settings_msg = await dg_ws.recv()
-            settings_data = json.loads(settings_msg)
-            msg_type = settings_data.get('type')
-            print(f"📩 Settings response: {msg_type}")
+            if isinstance(item, bytes):
+                # Audio data from agent - the bytes object from websockets, passed on as-is
+                await send({"type": "websocket.send", "bytes": item})
+                continue
             
-            if msg_type == "Error":
-                print(f"❌ Settings Error: {json.dumps(settings_data, indent=2)}")
-                await websocket.send_json({"type": "error", "message": "Failed to configure agent"})
-                return
+            # Drain JSON events that are already waiting (no added delay). Events are
+            # dicts, or Deepgram's own JSON text when the relay didn't need to parse it
+            events = [item if item.__class__ is str else _dumps(item)]
+            while len(events) < batch_max and not outbox.empty():
+                queued = outbox.get_nowait()
+                if queued.__class__ is str:
+                    events.append(queued)
+                elif isinstance(queued, dict):
+                    events.append(_dumps(queued))
+                else:
+                    carry = queued  # audio or _CLOSE - handled after this batch
+                    break
             
-            # Send ready signal to browser
-            await websocket.send_json({"type": "ready", "message": "Agent ready"})
-            print("✅ Agent ready for conversation")
+            if len(events) == 1:
+                await send({"type": "websocket.send", "text": events[0]})
+            else:
+                await send({"type": "websocket.send", "text": '{"type":"batch","events":[' + ",".join(events) + "]}"})
+    except Exception:
+        pass  # Browser disconnected mid-send - returning ends the relay
+
+async def _function_worker(ctx):
+    dg_ws, outbox, func_q = ctx.dg_ws, ctx.outbox, ctx.func_q
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await func_q.get()
+            if data is _CLOSE:
+                break
             
-            # Shared flag to signal disconnection
-            stop_relay = asyncio.Event()
+            start_timer("function_call_total")
+            print(f"🔧 Function call request")
             
-            # Task to receive from browser and forward to Deepgram
-            last_audio_time = None
-            async def browser_to_deepgram():
-                nonlocal last_audio_time
+            for func_call in data.get("functions", []):
+                func_id = func_call.get("id")
+                func_name = func_call.get("name")
+                func_args_str = func_call.get("arguments", "{}")
+                
+                print(f"   → Calling {func_name}({func_args_str})")
+                
+                # Parse arguments - malformed JSON or a non-string field gets an error reply, not a dead worker
                 try:
-                    while not stop_relay.is_set():
-                        data = await websocket.receive()
-                        
-                        if "bytes" in data:
-                            # Audio data from browser - track when user starts speaking
-                            if last_audio_time is None:
-                                start_timer("user_speech")
-                                last_audio_time = time.time()
-                            if not stop_relay.is_set():
-                                await dg_ws.send(data["bytes"])
-                        elif "text" in data:
-                            # Control messages from browser
-                            msg = json.loads(data["text"])
-                            if msg.get("type") == "ping":
-                                await websocket.send_json({"type": "pong"})
+                    func_args = _loads(func_args_str) if func_args_str else {}
+                except (ValueError, TypeError) as e:  # json/orjson JSONDecodeError, non-str arguments
+                    func_args = None
+                    result = _dumps({"error": f"Invalid arguments for '{func_name}': {e}", "success": False})
+                    print(f"   ✗ Invalid arguments: {e}")
+                
+                # Execute function
+                func = FUNCTION_MAP.get(func_name)
+                if func_args is None:
+                    pass  # result already holds the argument error
+                elif func:
+                    try:
+                        result = await loop.run_in_executor(
+                            function_executor,
+                            functools.partial(func, **func_args)
+                        )
+                        print(f"   ✓ Result: {result[:100]}..." if len(result) > 100 else f"   ✓ Result: {result}")
+                    except Exception as e:
+                        result = _dumps({"error": str(e), "success": False})
+                        print(f"   ✗ Error: {e}")
+                else:
+                    result = _dumps({"error": f"Function '{func_name}' not found", "success": False})
+                    print(f"   ✗ Function not found")
                 
-                except (WebSocketDisconnect, RuntimeError) as e:
-                    print("🌐 Browser disconnected")
-                    stop_relay.set()
-                except Exception as e:
-                    if not stop_relay.is_set():
-                        print(f"❌ Browser→Deepgram error: {e}")
-                    stop_relay.set()
+                # Send response to Deepgram
+                response = {
+                    "type": "FunctionCallResponse",
+                    "id": func_id,
+                    "name": func_name,
+                    "content": result
+                }
+                await dg_ws.send(_dumps(response))
+                
+                # ALSO send to browser for order display updates
+                await outbox.put(response)
             
-            # Task to receive from Deepgram and forward to browser
-            async def deepgram_to_browser():
-                nonlocal last_audio_time
+            end_timer("function_call_total", {"function": func_name if 'func_name' in locals() else "unknown"})
+    
+    except websockets.exceptions.ConnectionClosed:
+        pass  # Deepgram side closed - deepgram_to_browser reports it
+    except Exception as e:
+        print(f"❌ Function worker error: {e}")
+    # Let the sender finish what's queued, then stop (skipped when the relay is cancelled)
+    await outbox.put(_CLOSE)
+
+# Task to receive from Deepgram and forward to browser
+async def _deepgram_to_browser(ctx):
+    dg_ws, outbox = ctx.dg_ws, ctx.outbox
+    audio_carry = ctx.audio_carry
+    handlers = DG_HANDLERS
+    try:
+        async for msg in dg_ws:
+            if isinstance(msg, bytes):
+                # Audio data from agent - already frame-aligned chunks pass through uncopied
+                if not audio_carry and len(msg) % AUDIO_FRAME_BYTES == 0:
+                    await outbox.put(msg)
+                    continue
+                audio_carry += msg
+                aligned = len(audio_carry) - len(audio_carry) % AUDIO_FRAME_BYTES
+                if aligned:
+                    await outbox.put(bytes(memoryview(audio_carry)[:aligned]))
+                    del audio_carry[:aligned]
+            else:
+                # JSON message - forwarded as received unless a handler needs it parsed
+                msg_type = _peek_type(msg)
+                if msg_type is not None and msg_type not in handlers:
+                    await outbox.put(msg)
+                    continue
                 try:
-                    async for msg in dg_ws:
-                        if stop_relay.is_set():
-                            break
-                            
-                        if isinstance(msg, bytes):
-                            # Audio data from agent
-                            try:
-                                await websocket.send_bytes(msg)
-                            except (RuntimeError, Exception) as e:
-                                # Browser disconnected mid-send
-                                stop_relay.set()
-                                break
-                        else:
-                            # JSON message
-                            try:
-                                data = json.loads(msg)
-                                msg_type = data.get("type")
-                                
-                                # Track agent response time
-                                if msg_type == "UserStartedSpeaking":
-                                    # User finished speaking, agent is processing
-                                    if last_audio_time:
-                                        end_timer("user_speech", {"duration_sec": round(time.time() - last_audio_time, 2)})
-                                        last_audio_time = None
-                                    start_timer("deepgram_response")
-                                
-                                elif msg_type in ["AgentAudioDone", "AgentThinking"]:
-                                    # Agent finished responding
-                                    end_timer("deepgram_response", {"type": msg_type})
-                                
-                                # Handle function calls
-                                if msg_type == "FunctionCallRequest":
-                                    start_timer("function_call_total")
-                                    print(f"🔧 Function call request")
-                                    
-                                    for func_call in data.get("functions", []):
-                                        func_id = func_call.get("id")
-                                        func_name = func_call.get("name")
-                                        func_args_str = func_call.get("arguments", "{}")
-                                        
-                                        print(f"   → Calling {func_name}({func_args_str})")
-                                        
-                                        # Parse arguments
-                                        try:
-                                            func_args = json.loads(func_args_str)
-                                        except:
-                                            func_args = {}
-                                        
-                                        # Execute function
-                                        func = FUNCTION_MAP.get(func_name)
-                                        if func:
-                                            try:
-                                                loop = asyncio.get_event_loop()
-                                                result = await loop.run_in_executor(
-                                                    None,
-                                                    lambda: func(**func_args)
-                                                )
-                                                print(f"   ✓ Result: {result[:100]}..." if len(result) > 100 else f"   ✓ Result: {result}")
-                                            except Exception as e:
-                                                result = json.dumps({"error": str(e), "success": False})
-                                                print(f"   ✗ Error: {e}")
-                                        else:
-                                            result = json.dumps({"error": f"Function '{func_name}' not found", "success": False})
-                                            print(f"   ✗ Function not found")
-                                        
-                                        # Send response to Deepgram
-                                        if not stop_relay.is_set():
-                                            response = {
-                                                "type": "FunctionCallResponse",
-                                                "id": func_id,
-                                                "name": func_name,
-                                                "content": result
-                                            }
-                                            await dg_ws.send(json.dumps(response))
-                                            
-                                            # ALSO send to browser for order display updates
-                                            try:
-                                                await websocket.send_json(response)
-                                            except (RuntimeError, Exception):
-                                                # Browser disconnected
-                                                stop_relay.set()
-                                                break
-                                    
-                                    end_timer("function_call_total", {"function": func_name if 'func_name' in locals() else "unknown"})
-                                
-                                # Forward all messages to browser
-                                if not stop_relay.is_set():
-                                    try:
-                                        await websocket.send_json(data)
-                                    except (RuntimeError, Exception):
-                                        # Browser disconnected
-                                        stop_relay.set()
-                                        break
-                                
-                            except json.JSONDecodeError:
-                                pass
-                
-                except Exception as e:
-                    if not stop_relay.is_set():
-                        print(f"❌ Deepgram→Browser error: {e}")
-                    stop_relay.set()
+                    data = _loads(msg)
+                    handler = handlers.get(data.get("type"))
+                    if handler is not None:
+                        await handler(data, ctx)
+                    
+                    # Forward all messages to browser
+                    await outbox.put(data)
+                    
+                except ValueError:  # json/orjson JSONDecodeError - skip malformed messages
+                    pass
+    
+    except Exception as e:
+        print(f"❌ Deepgram→Browser error: {e}")
+    # The worker closes the outbox once the calls queued ahead of this are done
+    ctx.func_q.put_nowait(_CLOSE)
+
+# WebSocket endpoint for browser clients - a plain ASGI handler (registered below) rather than a
+# FastAPI route: the relay owns the socket's whole lifecycle and works on the ASGI receive/send
+# callables directly, so Starlette's WebSocket wrapper would only add a layer per frame
+async def websocket_endpoint(scope, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+    print("🌐 Browser client connected")
+    
+    # Start conversation log
+    jitb_functions.start_conversation_log()
+    
+    # Connect to Deepgram (a pre-connected pooled session when available)
+    try:
+        dg_ws = dg_pool.take() if dg_pool is not None else None
+        if dg_ws is not None:
+            print("✅ Using pre-connected Deepgram socket")
+            dg_ws = await configure_deepgram(dg_ws)
+        else:
+            dg_ws = await open_deepgram()
+        
+        try:
+            # Send welcome and ready signal to browser
+            await send({"type": "websocket.send", "text": _CONNECTED})
+            await send({"type": "websocket.send", "text": _READY})
+            print("✅ Agent ready for conversation")
             
-            # Run both relay tasks and handle their completion
-            await asyncio.gather(
-                browser_to_deepgram(),
-                deepgram_to_browser(),
-                return_exceptions=True
-            )
+            ctx = RelayContext(receive, send, dg_ws, batch=b"batch=1" in scope.get("query_string", b"").split(b"&"))
+            
+            # Run the relay tasks; the first side to finish ends the conversation and the rest are
+            # cancelled. If Deepgram ended it, the calls and events already queued still reach
+            # the browser before the browser reader is cancelled
+            browser_task = asyncio.create_task(_browser_to_deepgram(ctx))
+            dg_task = asyncio.create_task(_deepgram_to_browser(ctx))
+            worker_task = asyncio.create_task(_function_worker(ctx))
+            sender_task = asyncio.create_task(_browser_sender(ctx))
+            tasks = (browser_task, dg_task, worker_task, sender_task)
+            try:
+                done, _ = await asyncio.wait(
+                    (browser_task, dg_task, sender_task),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if dg_task in done and browser_task not in done:
+                    await asyncio.wait((browser_task, sender_task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
             
             print("✅ Connection closed gracefully")
+        finally:
+            await dg_ws.close()
+    
+    except DeepgramSettingsError as e:
+        try:
+            await send({"type": "websocket.send", "text": _dumps({"type": "error", "message": str(e)})})
+        except:
+            pass
     
     except Exception as e:
         print(f"❌ Connection error: {e}")
         try:
-            await websocket.send_json({"type": "error", "message": str(e)})
+            await send({"type": "websocket.send", "text": _dumps({"type": "error", "message": str(e)})})
         except:
             pass
     
@@ -360,9 +767,29 @@ async def websocket_endpoint(websocket: WebSocket):
         jitb_functions.end_conversation_log()
         print("🔚 Conversation ended")
 
+class _ASGIEndpoint:
+    """Wraps a (scope, receive, send) coroutine so Starlette routes to it as a raw ASGI app"""
+    
+    def __init__(self, handler):
+        self.handler = handler
+    
+    def __call__(self, scope, receive, send):
+        return self.handler(scope, receive, send)
+
+app.router.routes.append(WebSocketRoute("/ws", _ASGIEndpoint(websocket_endpoint)))
+
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     print("🚀 Starting Jack in the Box Voice Agent Server...")
     print("📍 Server will be available at http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # uvloop + httptools ship with uvicorn[standard] (not on Windows) - the relay spends most of its
+    # time in event-loop bookkeeping and socket I/O, so ask for them explicitly and fall back if missing
+    loop_impl = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http_impl = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    print(f"⚡ Event loop: {loop_impl} | HTTP parser: {http_impl}")
+    # Browser socket carries the same audio - no permessage-deflate there either
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=loop_impl, http=http_impl, ws="websockets",
+                ws_per_message_deflate=False, workers=1)
 